@@ -1,9 +1,13 @@
 from annolab.project_import import ProjectImport
 import os
+from typing import List, Union
 
 from annolab import endpoints
 from annolab.project import Project
+from annolab.project_migration import ProjectMigration
 from annolab.api_helper import ApiHelper
+from annolab.transport import Transport
+from annolab.util.rate_limiter import RateLimiter
 
 class AnnoLab:
 
@@ -11,8 +15,15 @@ class AnnoLab:
     self,
     api_key = None,
     api_url = 'https://api.annolab.ai',
+    rate_limiter: RateLimiter = None,
+    transport: Transport = None,
   ):
-    self.__api = ApiHelper(api_key=api_key, api_url=api_url)
+    """
+      Pass a RateLimiter to keep every request made through this client under a request budget.
+      Pass a transport to change how requests are sent, e.g. Http2Transport() to multiplex concurrent
+      requests over a few HTTP/2 connections. Defaults to a pooled HTTP/1.1 RequestsTransport.
+    """
+    self.__api = ApiHelper(api_key=api_key, api_url=api_url, rate_limiter=rate_limiter, transport=transport)
 
   @property
   def api_key_info(self):
@@ -61,16 +72,92 @@ class AnnoLab:
     return Project.create_from_response_json(res.json(), self.__api)
 
 
-  def create_project_from_export(self, filepath: str, name: str = None, owner_name: str = None, is_public=False):
+  def create_project_from_export(
+    self,
+    filepath: str,
+    name: str = None,
+    owner_name: str = None,
+    is_public=False,
+    workers: int = 4,
+    dead_letter_path: str = None,
+    with_report: bool = False
+  ):
+    """
+      Creates a project and imports an export into it. Records the api rejects are written to
+      dead_letter_path, by default <filepath>.rejected.jsonl.
+
+      Returns the project, or with with_report=True a (project, report) pair,
+      where report is as returned by Project.update_from_export.
+    """
     if (name is None):
       name = os.path.basename(filepath).split('.')[0]
 
     project = self.create_project(name, owner_name, is_public=is_public)
-    project_import = ProjectImport(filepath, project, owner_name)
+    project_import = ProjectImport(filepath, project, owner_name, dead_letter_path=dead_letter_path)
 
     project_import.unzip_export()
-    project_import.import_all()
+    project_import.import_all(workers=workers)
     project_import.cleanup()
 
+    if (with_report):
+      return project, project_import.report
+
     return project
 
+
+  def clone_projects(
+    self,
+    projects: List[Union[str, Project]],
+    owner_name: str = None,
+    target_owner_name: str = None,
+    name_format: str = '{name}',
+    export_workers: int = 4,
+    import_workers: int = 2,
+    upload_workers: int = 4,
+    is_public: bool = False,
+    workdir: str = None,
+    timeout: int = 3600,
+    dead_letter_dir: str = None,
+    max_archives: int = None
+  ) -> List[dict]:
+    """
+      Copies many projects, overlapping the export, download and import of different projects.
+      Projects may be passed by name (looked up in owner_name) or as Project instances.
+      Copies are created in target_owner_name, named by name_format, e.g. '{name} (copy)'.
+
+      export_workers:  int  Max exports being generated or downloaded at once.
+      import_workers:  int  Max projects being imported at once.
+      upload_workers:  int  Max concurrent bulk requests of each kind per import. Not shared between imports,
+                            so pass a rate_limiter to AnnoLab to bound the requests of all imports together.
+      max_archives:    int  Max export archives on disk at once. Defaults to export_workers + import_workers.
+      dead_letter_dir: str  Directory records rejected by the api are written to. Defaults to the current directory.
+
+      Returns one report dict per project, in the order given, with its status
+      ('finished' or 'errored'), the failing stage and error, the time spent in each phase,
+      and the counts of unresolved relations and rejected records, with the dead-letter file they were written to.
+    """
+    migration = ProjectMigration(
+      self,
+      projects,
+      owner_name=owner_name,
+      target_owner_name=target_owner_name,
+      name_format=name_format,
+      export_workers=export_workers,
+      import_workers=import_workers,
+      upload_workers=upload_workers,
+      is_public=is_public,
+      workdir=workdir,
+      timeout=timeout,
+      dead_letter_dir=dead_letter_dir,
+      max_archives=max_archives
+    )
+
+    return migration.run()
+
+
+  def migrate_group(self, project_names: List[str], owner_name: str, target_owner_name: str, **kwargs) -> List[dict]:
+    """
+      Copies the named projects of one group into another group, keeping their names.
+      Accepts the same options as clone_projects.
+    """
+    return self.clone_projects(project_names, owner_name=owner_name, target_owner_name=target_owner_name, **kwargs)
@@ -1,5 +1,7 @@
 from typing import Dict
 
+from annolab.geometry import Geometry
+
 class Annotation:
 
   @staticmethod
@@ -12,8 +14,10 @@ class Annotation:
       client_id:  str  (Optional, Required if passing relations)
       value:      str  (Optional)
       offsets:    [int, int] (Optional)
-      text_bounds { 'type': 'Polygon', coordinates: List[List[List[int]]] } (Optional)
-      bbox:       [int, int, int, int] (Optional, Ignored if text_bounds are passed)
+      text_bounds { 'type': 'Polygon', coordinates: List[List[List[int]]] } or Geometry (Optional)
+      image_bounds { 'type': 'Polygon', coordinates: List[List[List[int]]] } or Geometry (Optional)
+      bbox:       [int, int, int, int] (Optional, Ignored if text_bounds are passed.
+                  Computed from text_bounds or image_bounds if they are passed as a Geometry)
       layer:      str  (Optional)
       page:       int  (Optional)
       reviewed    bool (Optional)
@@ -24,8 +28,8 @@ class Annotation:
     if ('offsets' in dict): annotation['offsets'] = dict['offsets']
     if ('value' in dict): annotation['value'] = dict['value']
     if ('bbox' in dict): annotation['bbox'] = dict['bbox']
-    if ('text_bounds' in dict): annotation['textBounds'] = dict['text_bounds']
-    if ('image_bounds' in dict): annotation['imageBounds'] = dict['image_bounds']
+    if ('text_bounds' in dict): annotation['textBounds'] = Annotation.__encode_bounds(dict['text_bounds'])
+    if ('image_bounds' in dict): annotation['imageBounds'] = Annotation.__encode_bounds(dict['image_bounds'])
     if ('layer' in dict): annotation['layerIdentifier'] = dict['layer']
     if ('page' in dict): annotation['pageNumber'] = dict['page']
     if ('endPage' in dict): annotation['endPageNumber'] = dict['endPage']
@@ -34,4 +38,15 @@ class Annotation:
     if ('directory' in dict): annotation['directoryIdentifier'] = dict['directory']
     if ('project' in dict): annotation['projectIdentifier'] = dict['project']
 
-    return annotation
\ No newline at end of file
+    if ('bbox' not in annotation):
+      for key in ('text_bounds', 'image_bounds'):
+        if (isinstance(dict.get(key), Geometry)):
+          annotation['bbox'] = dict[key].bbox
+          break
+
+    return annotation
+
+
+  @staticmethod
+  def __encode_bounds(bounds):
+    return bounds.to_geojson() if isinstance(bounds, Geometry) else bounds
\ No newline at end of file
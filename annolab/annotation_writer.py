@@ -0,0 +1,316 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import itertools
+import json
+import logging
+import threading
+import time
+from typing import Dict, List
+
+from annolab.annotation import Annotation
+from annolab.annotation_relation import AnnotationRelation
+from annolab.util.json_stream import encode_json_default
+
+
+class _BatchQueue:
+  """Queued records of one kind, with their encoded size and the time the oldest was queued."""
+
+  def __init__(self):
+    self.items = deque()
+    self.bytes = 0
+
+
+  def __len__(self):
+    return len(self.items)
+
+
+  def append(self, record: Dict, size: int, future: Future):
+    self.items.append((record, size, future, time.monotonic()))
+    self.bytes += size
+
+
+  def deadline(self, linger: float):
+    return self.items[0][3] + linger if len(self.items) > 0 else None
+
+
+  def is_ready(self, now: float, linger: float, max_count: int, max_bytes: int, force: bool):
+    if (len(self.items) == 0):
+      return False
+
+    return force or len(self.items) >= max_count or self.bytes >= max_bytes or now >= self.deadline(linger)
+
+
+  def take(self, max_count: int, max_bytes: int):
+    batch = []
+    size = 0
+    while (len(self.items) > 0 and len(batch) < max_count and (len(batch) == 0 or size + self.items[0][1] <= max_bytes)):
+      record, record_size, future, _ = self.items.popleft()
+      batch.append((record, future))
+      size += record_size
+
+    self.bytes -= size
+    return batch
+
+
+class AnnotationWriter:
+  """
+    Writes annotations and relations in the background, coalescing many small submissions into
+    create_bulk_annotations and create_bulk_relations calls.
+
+    A batch is sent once it holds max_batch_count records or max_batch_bytes of encoded json, or once its
+    oldest record has waited linger seconds. Up to `workers` batches are in flight at once; records keep
+    accumulating into larger batches while they are. submit blocks only when max_queued records are waiting.
+
+    submit and submit_relation return Futures, resolved with the created id (or None if the api dropped the
+    record as a duplicate), or with the exception of the failed request. The endpoints of a relation may be
+    Futures returned by submit; the relation is queued once both annotations are created.
+
+    Annotations are sdk dicts as accepted by create_bulk_annotations. The writer assigns their client_id,
+    and fills in project when missing. Call close, or use the writer as a context manager, to flush
+    everything before exiting.
+
+      with AnnotationWriter(project) as writer:
+        first = writer.submit({ 'type': 'Person', 'source': 'doc.txt', 'offsets': [0, 5] })
+        second = writer.submit({ 'type': 'Person', 'source': 'doc.txt', 'offsets': [10, 15] })
+        writer.submit_relation({ 'type': 'knows', 'annotations': [first, second] })
+  """
+
+  def __init__(
+    self,
+    project,
+    linger: float = 0.05,
+    max_batch_count: int = 500,
+    max_batch_bytes: int = 4 * 1024 * 1024,
+    max_queued: int = 100000,
+    workers: int = 2,
+    dedup: bool = True
+  ):
+    self.project = project
+    self.linger = linger
+    self.max_batch_count = max_batch_count
+    self.max_batch_bytes = max_batch_bytes
+    self.max_queued = max_queued
+    self.workers = workers
+    self.dedup = dedup
+
+    self.__condition = threading.Condition()
+    self.__annotations = _BatchQueue()
+    self.__relations = _BatchQueue()
+    self.__client_ids = itertools.count()
+    # Relations waiting for their endpoint annotations to be created.
+    self.__waiting = 0
+    self.__in_flight = 0
+    self.__flushing = 0
+    self.__closed = False
+
+    self.__executor = ThreadPoolExecutor(max_workers=workers)
+    self.__thread = threading.Thread(target=self.__run, name='AnnotationWriter', daemon=True)
+    self.__thread.start()
+
+
+  def __enter__(self):
+    return self
+
+
+  def __exit__(self, *args):
+    self.close()
+
+
+  def submit(self, annotation: Dict) -> Future:
+    """Queues an sdk annotation dict. Returns a Future resolved with the created annotation's id."""
+    annotation = dict(annotation)
+    annotation['client_id'] = f'w{next(self.__client_ids)}'
+    annotation.setdefault('project', self.project.id or self.project.name)
+
+    api_annotation = Annotation.create_api_annotation(annotation)
+    future = Future()
+    self.__enqueue(self.__annotations, api_annotation, future)
+
+    return future
+
+
+  def submit_relation(self, relation: Dict) -> Future:
+    """
+      Queues an sdk relation dict, whose annotations may be ids or Futures returned by submit.
+      Returns a Future resolved with the created relation's id.
+    """
+    future = Future()
+    endpoints = [endpoint for endpoint in relation['annotations'] if isinstance(endpoint, Future)]
+
+    with self.__condition:
+      if (self.__closed):
+        raise Exception('AnnotationWriter is closed.')
+      self.__waiting += 1
+
+    remaining = [len(endpoints)]
+
+    def on_endpoint_done(_):
+      with self.__condition:
+        remaining[0] -= 1
+        if (remaining[0] > 0):
+          return
+      self.__queue_relation(relation, future)
+
+    if (len(endpoints) == 0):
+      self.__queue_relation(relation, future)
+    for endpoint in endpoints:
+      endpoint.add_done_callback(on_endpoint_done)
+
+    return future
+
+
+  def flush(self):
+    """Sends everything submitted so far, and waits until it has been written."""
+    with self.__condition:
+      self.__flushing += 1
+      self.__condition.notify_all()
+      try:
+        while (not self.__is_idle()):
+          self.__condition.wait()
+      finally:
+        self.__flushing -= 1
+
+
+  def close(self):
+    """Flushes everything submitted and stops the writer. Further submissions raise."""
+    with self.__condition:
+      self.__closed = True
+      self.__condition.notify_all()
+
+    self.__thread.join()
+    self.__executor.shutdown(wait=True)
+
+
+  def __queue_relation(self, relation: Dict, future: Future):
+    try:
+      annotation_ids = [self.__resolve_endpoint(endpoint) for endpoint in relation['annotations']]
+      api_relation = AnnotationRelation.create_api_relation({
+        **relation,
+        'annotations': annotation_ids,
+        'project': relation.get('project', self.project.id or self.project.name)
+      })
+    except Exception as e:
+      future.set_exception(e)
+      api_relation = None
+
+    with self.__condition:
+      self.__waiting -= 1
+      if (api_relation is not None):
+        self.__relations.append(api_relation, self.__encoded_size(api_relation), future)
+      self.__condition.notify_all()
+
+
+  def __resolve_endpoint(self, endpoint):
+    if (not isinstance(endpoint, Future)):
+      return endpoint
+
+    if (endpoint.exception() is not None):
+      raise Exception(f'Relation endpoint annotation was not created: {endpoint.exception()}')
+    if (endpoint.result() is None):
+      raise Exception('Relation endpoint annotation was not created, it was dropped as a duplicate.')
+
+    return endpoint.result()
+
+
+  def __enqueue(self, queue: _BatchQueue, record: Dict, future: Future):
+    size = self.__encoded_size(record)
+
+    with self.__condition:
+      while (not self.__closed and len(self.__annotations) + len(self.__relations) >= self.max_queued):
+        self.__condition.wait()
+      if (self.__closed):
+        raise Exception('AnnotationWriter is closed.')
+
+      queue.append(record, size, future)
+      self.__condition.notify_all()
+
+
+  def __encoded_size(self, record: Dict):
+    return len(json.dumps(record, separators=(',', ':'), default=encode_json_default))
+
+
+  def __is_idle(self):
+    return len(self.__annotations) == 0 and len(self.__relations) == 0 and self.__waiting == 0 and self.__in_flight == 0
+
+
+  def __run(self):
+    queues = [
+      (self.__annotations, self.__send_annotations),
+      (self.__relations, self.__send_relations),
+    ]
+
+    with self.__condition:
+      while True:
+        now = time.monotonic()
+        force = self.__closed or self.__flushing > 0
+
+        sent = False
+        for queue, send in queues:
+          if (self.__in_flight < self.workers
+            and queue.is_ready(now, self.linger, self.max_batch_count, self.max_batch_bytes, force)):
+            batch = queue.take(self.max_batch_count, self.max_batch_bytes)
+            self.__in_flight += 1
+            self.__executor.submit(send, batch)
+            sent = True
+
+        if (sent):
+          # Unblocks submissions waiting for room in the queue.
+          self.__condition.notify_all()
+          continue
+
+        if (self.__closed and self.__is_idle()):
+          return
+
+        deadlines = [queue.deadline(self.linger) for queue, _ in queues if len(queue) > 0]
+        timeout = max(0, min(deadlines) - now) if len(deadlines) > 0 and self.__in_flight < self.workers else None
+        self.__condition.wait(timeout)
+
+
+  def __send_annotations(self, batch: List):
+    try:
+      created = self.project.create_bulk_annotations(
+        [record for record, _ in batch],
+        dedup=self.dedup,
+        encoded=True,
+        fields=['clientId', 'id']
+      )
+      ids = { annotation.get('clientId'): annotation.get('id') for annotation in created }
+      results = [ids.get(record['clientId']) for record, _ in batch]
+    except Exception as e:
+      logging.warning(f'AnnotationWriter failed to create {len(batch)} annotations: {e}')
+      self.__complete(batch, error=e)
+    else:
+      self.__complete(batch, results=results)
+
+
+  def __send_relations(self, batch: List):
+    try:
+      created = self.project.create_bulk_relations(
+        [record for record, _ in batch],
+        dedup=self.dedup,
+        encoded=True,
+        fields=['id']
+      )
+      # Relations carry no client id, so created ids are matched by position when none were dropped.
+      if (len(created) == len(batch)):
+        results = [relation.get('id') for relation in created]
+      else:
+        results = [None] * len(batch)
+    except Exception as e:
+      logging.warning(f'AnnotationWriter failed to create {len(batch)} relations: {e}')
+      self.__complete(batch, error=e)
+    else:
+      self.__complete(batch, results=results)
+
+
+  def __complete(self, batch: List, results: List = None, error: Exception = None):
+    try:
+      for index, (_, future) in enumerate(batch):
+        if (error is not None):
+          future.set_exception(error)
+        else:
+          future.set_result(results[index])
+    finally:
+      with self.__condition:
+        self.__in_flight -= 1
+        self.__condition.notify_all()
@@ -1,12 +1,19 @@
-from typing import Dict, Any
-import requests
+from typing import Dict, Any, Iterable, Iterator, List
+import json
+import os
 from urllib import parse
 import logging
+from requests.exceptions import HTTPError
 from requests.models import Response
 
 import annolab
 from annolab import endpoints
 from annolab.util.cached_property import cached_property
+from annolab.util.json_response import iter_array_items
+from annolab.util.json_stream import encode_json_default
+from annolab.transport import RequestsTransport, Transport
+from annolab.util.rate_limiter import RateLimiter
+from annolab.util.single_flight import SingleFlight
 
 class ApiHelper(object):
 
@@ -14,9 +21,15 @@ class ApiHelper(object):
     self,
     api_key = None,
     api_url = 'https://api.annolab.ai',
+    rate_limiter: RateLimiter = None,
+    transport: Transport = None,
   ):
     self.api_url = api_url
     self.api_key = api_key or annolab.api_key
+    self.rate_limiter = rate_limiter
+    self.transport = transport or RequestsTransport()
+    # Concurrent identical GETs share a single request.
+    self.single_flight = SingleFlight()
 
 
   @property
@@ -25,6 +38,11 @@ class ApiHelper(object):
     return { 'Authorization': f'Api-Key {key}' }
 
 
+  @property
+  def __json_headers(self):
+    return { **self.__auth_header, 'Content-Type': 'application/json' }
+
+
   @cached_property
   def api_key_info(self):
     return self.get_request(endpoints.ApiKey.get_api_key_info()).json()
@@ -45,33 +63,100 @@ class ApiHelper(object):
 
 
   def get_request(self, path: str, body: Dict[str, Any] = None, params: dict = None) -> Response:
-    resp = requests.get(
+    """
+      Sends a GET request. While an identical request (same path, params and body) is in flight,
+      the response, or error, of that request is returned instead of sending another.
+    """
+    data = json.dumps(body, default=encode_json_default).encode('utf-8') if body is not None else None
+    key = (path, json.dumps(params, sort_keys=True, default=str), data)
+
+    return self.single_flight.do(key, lambda: self.__send_get_request(path, data, params))
+
+
+  def __send_get_request(self, path: str, data: bytes, params: dict) -> Response:
+    if (self.rate_limiter is not None):
+      self.rate_limiter.acquire(RateLimiter.endpoint_class(path))
+
+    resp = self.transport.request(
+      'GET',
       parse.urljoin(self.api_url, path),
-      headers=self.__auth_header,
-      json=body
+      headers=self.__json_headers if data is not None else self.__auth_header,
+      data=data,
+      params=params
     )
 
-    self.__handle_non_2xx_response(resp)
+    self.__handle_non_2xx_response(resp, 'GET', path)
 
     return resp
 
 
-  def post_request(self, path: str, body: Dict[str, Any] = None, params: dict = None, timeout: float = 30.0):
-    resp = requests.post(
+  def post_request(
+    self,
+    path: str,
+    body: Dict[str, Any] = None,
+    params: dict = None,
+    timeout: float = 30.0,
+    headers: dict = None,
+    stream_response: bool = False
+  ):
+    data = json.dumps(body, default=encode_json_default).encode('utf-8') if body is not None else None
+
+    if (self.rate_limiter is not None):
+      self.rate_limiter.acquire(RateLimiter.endpoint_class(path), len(data or b''))
+
+    resp = self.transport.request(
+      'POST',
       parse.urljoin(self.api_url, path),
-      headers=self.__auth_header,
-      json=body,
+      headers={ **self.__json_headers, **(headers or {}) },
+      data=data,
       params=params,
-      timeout=timeout
+      timeout=timeout,
+      stream=stream_response
+    )
+
+    self.__handle_non_2xx_response(resp, 'POST', path)
+
+    return resp
+
+
+  def post_stream_request(
+    self,
+    path: str,
+    chunks: Iterable[bytes],
+    params: dict = None,
+    timeout: float = 30.0,
+    headers: dict = None,
+    stream_response: bool = False
+  ):
+    """
+      Posts a json body produced incrementally by `chunks`, using chunked transfer encoding.
+    """
+    if (self.rate_limiter is not None):
+      endpoint_class = RateLimiter.endpoint_class(path)
+      self.rate_limiter.acquire(endpoint_class)
+      chunks = self.rate_limiter.limit_chunks(endpoint_class, chunks)
+
+    resp = self.transport.request(
+      'POST',
+      parse.urljoin(self.api_url, path),
+      headers={ **self.__json_headers, **(headers or {}) },
+      data=iter(chunks),
+      params=params,
+      timeout=timeout,
+      stream=stream_response
     )
 
-    self.__handle_non_2xx_response(resp)
+    self.__handle_non_2xx_response(resp, 'POST', path)
 
     return resp
 
 
   def put_request(self, path: str, data: Any = None, headers = None, params: dict = None, timeout: float = 30.0):
-    resp = requests.put(
+    if (self.rate_limiter is not None):
+      self.rate_limiter.acquire('upload', self.__data_size(data))
+
+    resp = self.transport.request(
+      'PUT',
       parse.urljoin(self.api_url, path),
       headers=headers,
       data=data,
@@ -79,19 +164,45 @@ class ApiHelper(object):
       timeout=timeout
     )
 
-    self.__handle_non_2xx_response(resp)
+    self.__handle_non_2xx_response(resp, 'PUT', path)
 
     return resp
 
 
-  def __handle_non_2xx_response(self, resp: Response):
+  def iter_response_items(self, resp: Response, fields: List[str] = None) -> Iterator:
+    """
+      Incrementally decodes the json array body of a response made with stream_response=True,
+      keeping only `fields` of each item. Releases the connection once the body is consumed.
+    """
+    try:
+      for item in iter_array_items(self.transport.iter_bytes(resp), fields):
+        yield item
+    finally:
+      self.transport.close_response(resp)
+
+
+  def __data_size(self, data: Any):
+    if (isinstance(data, (bytes, bytearray))):
+      return len(data)
+    if (hasattr(data, 'fileno')):
+      try:
+        return os.fstat(data.fileno()).st_size
+      except (OSError, ValueError):
+        return 0
+    return 0
+
+
+  def __handle_non_2xx_response(self, resp: Response, method: str, path: str):
     if (resp.status_code >= 300):
       try:
+        # Streamed httpx responses must be read before their body can be decoded.
+        if (hasattr(resp, 'read')):
+          resp.read()
         resp_body = resp.json()
       except:
         resp_body = {}
 
       message = resp_body['message'] if 'message' in resp_body else 'Unknown Error'
 
-      logging.error(f'{resp.request.method} {resp.request.path_url} failed with message: {message}')
-      resp.raise_for_status()
+      logging.error(f'{method} {parse.urlparse(path).path} failed with message: {message}')
+      raise HTTPError(f'{resp.status_code} Error: {message} for {method} {path}', response=resp)
@@ -0,0 +1,309 @@
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Callable, Iterable, Iterator, List
+
+from annolab.annolab import AnnoLab
+from annolab.project_import import ProjectImport
+from annolab.transport import Http2Transport
+from annolab.util.jsonl_reader import read_batches
+from annolab.util.rate_limiter import RateLimiter
+
+
+class _Throughput:
+  """Counts records sent and reports the rate to stderr, every `interval` seconds and when finished."""
+
+  def __init__(self, label: str, interval: float = 10.0):
+    self.label = label
+    self.interval = interval
+    self.records = 0
+    self.batches = 0
+    self.started = time.monotonic()
+    self.last_report = self.started
+
+
+  def add(self, records: int):
+    self.records += records
+    self.batches += 1
+
+    if (time.monotonic() - self.last_report >= self.interval):
+      self.report()
+
+
+  def report(self, final: bool = False):
+    self.last_report = time.monotonic()
+    elapsed = max(self.last_report - self.started, 1e-9)
+    status = 'done' if final else 'progress'
+    print(
+      f'{self.label} {status}: {self.records} records in {self.batches} batches, '
+      f'{elapsed:.1f}s, {self.records / elapsed:.0f} records/s',
+      file=sys.stderr
+    )
+
+
+def _read_record_batches(paths: List[str], batch_size: int, parse_workers: int = None) -> Iterator[List[dict]]:
+  """Yields batches of json records from jsonl files, or stdin for '-'."""
+  for path in paths or ['-']:
+    if (path != '-'):
+      yield from read_batches(path, batch_size=batch_size, workers=parse_workers)
+      continue
+
+    batch = []
+    for line in sys.stdin.buffer:
+      if (not line.strip()):
+        continue
+      batch.append(json.loads(line))
+      if (len(batch) >= batch_size):
+        yield batch
+        batch = []
+
+    if (len(batch) > 0):
+      yield batch
+
+
+def _send_batches(batches: Iterable[List], send: Callable, workers: int, throughput: _Throughput, print_results: bool):
+  """
+    Sends batches with up to `workers` concurrent requests, keeping at most workers * 2 batches read ahead.
+    Results are handled in input order, and the first failure is raised.
+  """
+  in_flight = threading.BoundedSemaphore(workers * 2)
+  futures = deque()
+
+  def handle(future):
+    batch, results = future.result()
+    throughput.add(len(batch))
+    if (print_results):
+      for result in results or []:
+        sys.stdout.write(json.dumps(result) + '\n')
+
+  def send_batch(batch):
+    try:
+      return batch, send(batch)
+    finally:
+      in_flight.release()
+
+  with ThreadPoolExecutor(max_workers=workers) as pool:
+    for batch in batches:
+      in_flight.acquire()
+      futures.append(pool.submit(send_batch, batch))
+      while (len(futures) > 0 and futures[0].done()):
+        handle(futures.popleft())
+
+    while (len(futures) > 0):
+      handle(futures.popleft())
+
+  throughput.report(final=True)
+
+
+def _ingest_annotations(project, args):
+  def with_defaults(atn: dict):
+    keys = ('projectIdentifier', 'sourceIdentifier', 'directoryIdentifier') if args.encoded else ('project', 'source', 'directory')
+    for key, value in zip(keys, (project.id, args.source, args.directory)):
+      if (value is not None):
+        atn.setdefault(key, value)
+    return atn
+
+  def send(batch: List[dict]):
+    return project.create_bulk_annotations(
+      [with_defaults(atn) for atn in batch],
+      dedup=not args.no_dedup,
+      encoded=args.encoded,
+      fields=['clientId', 'id']
+    )
+
+  batches = _read_record_batches(args.files, args.batch_size, args.parse_workers)
+  _send_batches(batches, send, args.workers, _Throughput('annotations', args.progress_interval), args.print_ids)
+
+
+def _ingest_relations(project, args):
+  def with_defaults(rln: dict):
+    rln.setdefault('projectIdentifier' if args.encoded else 'project', project.id)
+    return rln
+
+  def send(batch: List[dict]):
+    return project.create_bulk_relations(
+      [with_defaults(rln) for rln in batch],
+      dedup=not args.no_dedup,
+      encoded=args.encoded,
+      fields=['id']
+    )
+
+  batches = _read_record_batches(args.files, args.batch_size, args.parse_workers)
+  _send_batches(batches, send, args.workers, _Throughput('relations', args.progress_interval), args.print_ids)
+
+
+def _ingest_sources(project, args):
+  """
+    Each line of a source manifest is either { 'name', 'text' } for a text source or
+    { 'file', 'name' (optional) } for a pdf, with an optional 'directory'.
+  """
+  def create(source: dict):
+    directory = source.get('directory', args.directory)
+    if (source.get('file') is not None):
+      return project.create_pdf_source(
+        source['file'],
+        source.get('name'),
+        directory,
+        ocr=source.get('ocr', False),
+        skip_duplicates=args.skip_duplicates
+      )
+
+    return project.create_text_source(source['name'], source['text'], directory)
+
+  def send(batch: List[dict]):
+    return [create(source) for source in batch]
+
+  # Sources are created one per request. A batch is the number of sources a worker creates at a time.
+  batches = _read_record_batches(args.files, args.batch_size, args.parse_workers)
+  _send_batches(batches, send, args.workers, _Throughput('sources', args.progress_interval), args.print_ids)
+
+
+def _export(project, args):
+  started = time.monotonic()
+  project.export(
+    args.filepath,
+    source_ids=args.source_ids,
+    layers=args.layers,
+    include_annotation_types=args.all or args.include_annotation_types,
+    include_sources=args.all or args.include_sources,
+    include_text_bounds=args.all or args.include_text_bounds,
+    timeout=args.timeout,
+    shards=args.shards,
+    workers=args.workers
+  )
+
+  elapsed = time.monotonic() - started
+  if (os.path.isfile(args.filepath)):
+    megabytes = os.path.getsize(args.filepath) / 1024 ** 2
+    print(f'export done: {args.filepath}, {megabytes:.1f}MB in {elapsed:.1f}s, {megabytes / elapsed:.1f}MB/s', file=sys.stderr)
+  else:
+    print(f'export done: {args.filepath} in {elapsed:.1f}s', file=sys.stderr)
+
+
+def _update(project, args):
+  started = time.monotonic()
+  report = project.update_from_export(
+    args.filepath,
+    skip_sources=args.skip_sources,
+    manifest_path=args.manifest,
+    baseline_export=args.baseline,
+    workers=args.workers,
+    dead_letter_path=args.dead_letter,
+    batch_size=args.batch_size,
+    parse_workers=args.parse_workers or os.cpu_count()
+  )
+
+  elapsed = max(time.monotonic() - started, 1e-9)
+  for kind, summary in report['summary'].items():
+    print(
+      f'{kind} done: {summary["uploaded"]} uploaded, {summary["unchanged"]} unchanged, {summary["rejected"]} rejected '
+      f'of {summary["total"]} records in {elapsed:.1f}s, {summary["uploaded"] / elapsed:.0f} records/s',
+      file=sys.stderr
+    )
+  print(f'update done: {args.filepath} in {elapsed:.1f}s', file=sys.stderr)
+  print(json.dumps(report))
+
+
+def _add_ingest_arguments(parser: argparse.ArgumentParser, batch_size: int = 500):
+  parser.add_argument('files', nargs='*', help='jsonl files to read. Reads stdin when omitted or "-".')
+  parser.add_argument('--batch-size', type=int, default=batch_size, help='Records per request.')
+  parser.add_argument('--workers', type=int, default=4, help='Concurrent requests.')
+  parser.add_argument('--parse-workers', type=int, default=None, help='Processes parsing each input file. Defaults to the number of cpus.')
+  parser.add_argument('--print-ids', action='store_true', help='Write the created records\' ids to stdout as jsonl.')
+
+
+def _build_parser():
+  parser = argparse.ArgumentParser(prog='annolab', description='Stream data into and out of AnnoLab projects.')
+  parser.add_argument('--api-key', default=os.environ.get('ANNOLAB_API_KEY'), help='Defaults to $ANNOLAB_API_KEY.')
+  parser.add_argument('--api-url', default='https://api.annolab.ai')
+  parser.add_argument('--owner', default=None, help='Group owning the project. Defaults to the api key\'s own group.')
+  parser.add_argument('--http2', action='store_true', help='Send requests over HTTP/2. Requires annolab[http2].')
+  parser.add_argument('--requests-per-second', type=float, default=None, help='Limit the rate of requests.')
+  parser.add_argument('--progress-interval', type=float, default=10.0, help='Seconds between throughput reports.')
+  parser.add_argument('-v', '--verbose', action='store_true')
+  commands = parser.add_subparsers(dest='command')
+  commands.required = True
+
+  annotations = commands.add_parser('annotations', help='Create annotations from jsonl sdk annotation dicts.')
+  annotations.add_argument('project')
+  _add_ingest_arguments(annotations)
+  annotations.add_argument('--source', default=None, help='Source of annotations that do not name one.')
+  annotations.add_argument('--directory', default=None, help='Directory of annotations that do not name one.')
+  annotations.add_argument('--encoded', action='store_true', help='Records are already api annotation dicts.')
+  annotations.add_argument('--no-dedup', action='store_true', help='Do not ask the api to skip duplicates.')
+  annotations.set_defaults(run=_ingest_annotations)
+
+  relations = commands.add_parser('relations', help='Create relations from jsonl sdk relation dicts.')
+  relations.add_argument('project')
+  _add_ingest_arguments(relations)
+  relations.add_argument('--encoded', action='store_true', help='Records are already api relation dicts.')
+  relations.add_argument('--no-dedup', action='store_true', help='Do not ask the api to skip duplicates.')
+  relations.set_defaults(run=_ingest_relations)
+
+  sources = commands.add_parser('sources', help='Create text and pdf sources from a jsonl source manifest.')
+  sources.add_argument('project')
+  _add_ingest_arguments(sources, batch_size=1)
+  sources.add_argument('--directory', default=None, help='Directory of sources that do not name one.')
+  sources.add_argument('--skip-duplicates', action='store_true', help='Skip pdfs whose content was already uploaded.')
+  sources.set_defaults(run=_ingest_sources)
+
+  export = commands.add_parser('export', help='Export a project.')
+  export.add_argument('project')
+  export.add_argument('filepath')
+  export.add_argument('--source-ids', type=int, nargs='+', default=None)
+  export.add_argument('--layers', nargs='+', default=None)
+  export.add_argument('--include-annotation-types', action='store_true')
+  export.add_argument('--include-sources', action='store_true')
+  export.add_argument('--include-text-bounds', action='store_true')
+  export.add_argument('--all', action='store_true', help='Include everything needed to import the export.')
+  export.add_argument('--shards', type=int, default=None, help='Split source ids into this many concurrent exports.')
+  export.add_argument('--workers', type=int, default=4, help='Concurrent shard exports.')
+  export.add_argument('--timeout', type=int, default=3600)
+  export.set_defaults(run=_export)
+
+  update = commands.add_parser('update', help='Import an export into a project.')
+  update.add_argument('project')
+  update.add_argument('filepath')
+  update.add_argument('--skip-sources', action='store_true')
+  update.add_argument('--manifest', default=None, help='Sync manifest, for differential updates.')
+  update.add_argument('--baseline', default=None, help='Previously imported export to diff against.')
+  update.add_argument('--dead-letter', default=None, help='File rejected records are written to.')
+  update.add_argument('--batch-size', type=int, default=ProjectImport.batch_size)
+  update.add_argument('--workers', type=int, default=4)
+  update.add_argument('--parse-workers', type=int, default=None, help='Processes parsing the export\'s jsonl files. Defaults to the number of cpus.')
+  update.set_defaults(run=_update)
+
+  return parser
+
+
+def main(argv: List[str] = None):
+  args = _build_parser().parse_args(argv)
+  logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+  lab = AnnoLab(
+    api_key=args.api_key,
+    api_url=args.api_url,
+    rate_limiter=RateLimiter(requests_per_second=args.requests_per_second) if args.requests_per_second else None,
+    transport=Http2Transport() if args.http2 else None
+  )
+
+  try:
+    project = lab.find_project(args.project, args.owner)
+    args.run(project, args)
+  except KeyboardInterrupt:
+    return 130
+  except Exception as e:
+    print(f'annolab {args.command} failed: {e}', file=sys.stderr)
+    return 1
+
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
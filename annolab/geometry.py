@@ -0,0 +1,211 @@
+from typing import Dict, List, Union
+
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
+
+class Geometry:
+  """
+    Polygon or MultiPolygon geometry stored as flat NumPy arrays, for building and encoding dense
+    text_bounds and image_bounds quickly. Requires numpy: pip install annolab[geometry]
+
+      coords:          (n, 2) array of the vertices of every ring, rings closed as in GeoJSON.
+      ring_offsets:    (r + 1,) array, ring i is coords[ring_offsets[i]:ring_offsets[i + 1]].
+      polygon_offsets: (p + 1,) array, polygon j is made of rings polygon_offsets[j] to polygon_offsets[j + 1].
+                       The first ring of a polygon is its exterior, the rest are holes.
+
+    A Geometry may be passed anywhere the sdk accepts text_bounds or image_bounds. It is encoded to the
+    api's GeoJSON-like shape, and used to fill in the annotation's bbox if none is given.
+  """
+
+  def __init__(self, coords, ring_offsets, polygon_offsets, multi: bool = None):
+    if (np is None):
+      raise Exception('Geometry requires numpy. Install it with: pip install annolab[geometry]')
+
+    self.coords = np.asarray(coords)
+    self.ring_offsets = np.asarray(ring_offsets, dtype=np.int64)
+    self.polygon_offsets = np.asarray(polygon_offsets, dtype=np.int64)
+    self.multi = multi if multi is not None else len(self.polygon_offsets) > 2
+
+
+  @staticmethod
+  def from_geojson(geojson: Dict) -> 'Geometry':
+    """Builds a Geometry from a { 'type': 'Polygon' or 'MultiPolygon', 'coordinates': [...] } dict."""
+    multi = geojson['type'] == 'MultiPolygon'
+    polygons = geojson['coordinates'] if multi else [geojson['coordinates']]
+
+    rings = [ring for polygon in polygons for ring in polygon]
+    ring_offsets = np.zeros(len(rings) + 1, dtype=np.int64)
+    np.cumsum([len(ring) for ring in rings], out=ring_offsets[1:])
+    polygon_offsets = np.zeros(len(polygons) + 1, dtype=np.int64)
+    np.cumsum([len(polygon) for polygon in polygons], out=polygon_offsets[1:])
+
+    coords = np.array([point for ring in rings for point in ring], dtype=np.float64).reshape(-1, 2)
+
+    return Geometry(coords, ring_offsets, polygon_offsets, multi=multi)
+
+
+  @staticmethod
+  def from_boxes(boxes) -> 'Geometry':
+    """
+      Builds a MultiPolygon of rectangles from a (k, 4) array of [x0, y0, x1, y1] boxes.
+      A single box gives a Polygon.
+    """
+    boxes = np.asarray(boxes).reshape(-1, 4)
+    x0, y0, x1, y1 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+
+    coords = np.stack([
+      np.stack([x0, y0], axis=1),
+      np.stack([x1, y0], axis=1),
+      np.stack([x1, y1], axis=1),
+      np.stack([x0, y1], axis=1),
+      np.stack([x0, y0], axis=1),
+    ], axis=1).reshape(-1, 2)
+
+    count = len(boxes)
+    return Geometry(coords, np.arange(0, 5 * count + 1, 5), np.arange(count + 1), multi=count > 1)
+
+
+  @staticmethod
+  def coerce(value: Union['Geometry', Dict]) -> 'Geometry':
+    return value if isinstance(value, Geometry) else Geometry.from_geojson(value)
+
+
+  def __len__(self):
+    return len(self.polygon_offsets) - 1
+
+
+  @property
+  def bbox(self) -> List:
+    """[x0, y0, x1, y1] bounds of the whole geometry."""
+    if (len(self.coords) == 0):
+      return None
+
+    return np.concatenate([self.coords.min(axis=0), self.coords.max(axis=0)]).tolist()
+
+
+  def polygon_bboxes(self):
+    """(p, 4) array of the [x0, y0, x1, y1] bounds of each polygon's exterior ring."""
+    exterior_starts = self.ring_offsets[self.polygon_offsets[:-1]]
+    exterior_ends = self.ring_offsets[self.polygon_offsets[:-1] + 1]
+
+    # Vertices outside of exterior rings are masked out of the reduction.
+    mask = np.zeros(len(self.coords) + 1, dtype=np.int64)
+    np.add.at(mask, exterior_starts, 1)
+    np.add.at(mask, exterior_ends, -1)
+    in_exterior = np.cumsum(mask[:-1]) > 0
+
+    lower = np.where(in_exterior[:, None], self.coords, np.inf)
+    upper = np.where(in_exterior[:, None], self.coords, -np.inf)
+
+    return np.concatenate([
+      np.minimum.reduceat(lower, exterior_starts, axis=0),
+      np.maximum.reduceat(upper, exterior_starts, axis=0),
+    ], axis=1)
+
+
+  def quantize(self, precision: float = 1) -> 'Geometry':
+    """
+      Snaps coordinates to a grid of `precision` and drops repeated vertices, shrinking the payload.
+      Integer precisions produce integer coordinates.
+    """
+    coords = np.round(self.coords / precision) * precision
+    if (float(precision).is_integer()):
+      coords = coords.astype(np.int64)
+
+    ring_ids = self.__ring_ids()
+    keep = np.ones(len(coords), dtype=bool)
+    keep[1:] = np.any(coords[1:] != coords[:-1], axis=1)
+    keep[self.ring_offsets[:-1]] = True
+
+    return self.__filter(coords, keep, ring_ids)
+
+
+  def simplify(self, tolerance: float) -> 'Geometry':
+    """
+      Drops vertices whose triangle with their neighbours has an area of at most `tolerance`
+      (Visvalingam-Whyatt). Each vectorized pass drops only vertices with a smaller area than any
+      neighbouring candidate, so two neighbours are never dropped together. Areas are then recomputed
+      and passes repeat until no vertex can be dropped. Rings are never reduced below a triangle.
+    """
+    geometry = self
+    while True:
+      simplified = geometry.__simplify_pass(tolerance)
+      if (len(simplified.coords) == len(geometry.coords)):
+        return simplified
+      geometry = simplified
+
+
+  def to_geojson(self) -> Dict:
+    """Encodes the geometry in the api's { 'type', 'coordinates' } shape."""
+    points = self.coords.tolist()
+    ring_offsets = self.ring_offsets.tolist()
+    rings = [points[start:end] for start, end in zip(ring_offsets[:-1], ring_offsets[1:])]
+
+    polygon_offsets = self.polygon_offsets.tolist()
+    polygons = [rings[start:end] for start, end in zip(polygon_offsets[:-1], polygon_offsets[1:])]
+
+    if (self.multi):
+      return { 'type': 'MultiPolygon', 'coordinates': polygons }
+
+    return { 'type': 'Polygon', 'coordinates': polygons[0] if len(polygons) > 0 else [] }
+
+
+  def __simplify_pass(self, tolerance: float) -> 'Geometry':
+    coords = self.coords
+    ring_ids = self.__ring_ids()
+    starts = self.ring_offsets[:-1][ring_ids]
+    # The last vertex of each ring repeats the first, so neighbours wrap around the unique vertices.
+    last_unique = self.ring_offsets[1:][ring_ids] - 2
+
+    index = np.arange(len(coords))
+    previous_index = np.where(index == starts, last_unique, index - 1)
+    next_index = np.where(index >= last_unique, starts, index + 1)
+
+    previous = coords[previous_index].astype(np.float64)
+    current = coords.astype(np.float64)
+    following = coords[next_index].astype(np.float64)
+    area = np.abs(
+      (current[:, 0] - previous[:, 0]) * (following[:, 1] - previous[:, 1]) -
+      (following[:, 0] - previous[:, 0]) * (current[:, 1] - previous[:, 1])
+    ) / 2
+
+    candidate = area <= tolerance
+    candidate[self.ring_offsets[:-1]] = False
+    candidate[self.ring_offsets[1:] - 1] = False
+
+    # A candidate is dropped only if it has the smallest area, ties broken by position, among
+    # itself and its neighbouring candidates.
+    rank = np.lexsort((index, area))
+    order = np.empty(len(coords), dtype=np.int64)
+    order[rank] = index
+    drop = candidate.copy()
+    drop &= ~(candidate[previous_index] & (order[previous_index] < order))
+    drop &= ~(candidate[next_index] & (order[next_index] < order))
+
+    # Rings that would fall below a triangle drop only their smallest candidate this pass.
+    ring_count = len(self.ring_offsets) - 1
+    too_short = np.bincount(ring_ids, weights=~drop, minlength=ring_count) < 4
+    first_drop = np.full(ring_count, len(coords), dtype=np.int64)
+    np.minimum.at(first_drop, ring_ids[drop], order[drop])
+    drop &= ~too_short[ring_ids] | (order == first_drop[ring_ids])
+
+    return self.__filter(coords, ~drop, ring_ids)
+
+
+  def __ring_ids(self):
+    return np.repeat(np.arange(len(self.ring_offsets) - 1), np.diff(self.ring_offsets))
+
+
+  def __filter(self, coords, keep, ring_ids):
+    # Rings left with fewer than 4 vertices (a closed triangle) are kept whole.
+    ring_count = len(self.ring_offsets) - 1
+    kept_per_ring = np.bincount(ring_ids, weights=keep, minlength=ring_count)
+    keep = keep | (kept_per_ring < 4)[ring_ids]
+
+    ring_offsets = np.zeros(ring_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ring_ids, weights=keep, minlength=ring_count).astype(np.int64), out=ring_offsets[1:])
+
+    return Geometry(coords[keep], ring_offsets, self.polygon_offsets, multi=self.multi)
@@ -1,14 +1,27 @@
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
 import io
+import logging
 from os import path
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, Iterable, List, Union
 import requests
+from requests.exceptions import HTTPError
 
 from annolab import endpoints
 from annolab.api_helper import ApiHelper
 from annolab.annotation import Annotation
 from annolab.annotation_relation import AnnotationRelation
 from annolab.project_import import ProjectImport
-from annolab.project_export import ProjectExport
+from annolab.project_export import ProjectExport, ShardedProjectExport
+from annolab.source_cache import SourceCache
+from annolab.text_bounds_index import TextBoundsIndex
+from annolab.upload_manifest import UploadManifest
+from annolab.sync_manifest import SyncManifest
+from annolab.util.chunking import partition_annotations
+from annolab.util.dedup import Deduplicator
+from annolab.util.file_hash import hash_file
+from annolab.util.fingerprint import annotation_fingerprint
+from annolab.util.json_stream import iter_json_body
 
 class Project:
 
@@ -26,6 +39,7 @@ class Project:
     self.owner_name = owner_name
     self.owner_id = owner_id
     self.default_dir = default_dir
+    self.deduplicator = None
     self.__api = api_helper
 
 
@@ -34,21 +48,65 @@ class Project:
     return f'{self.owner_name}/{self.name}'
 
 
-  def find_source(self, name: str, directory: str = None):
+  def enable_client_dedup(self, capacity: int = 1000000, bloom: bool = False, error_rate: float = 0.001):
+    """
+      Drops duplicate annotations on the client, within and across calls to create_annotations and
+      create_bulk_annotations made through this project. Returns the Deduplicator, whose `dropped`
+      attribute counts the annotations dropped so far. Annotations are only remembered once the call
+      sending them succeeds, so a failed call can be retried as is.
+
+      capacity:   int   Number of annotations remembered before the oldest are forgotten.
+      bloom:      bool  Use a bloom filter instead of an exact set. Far smaller, but drops roughly
+                        error_rate of unique annotations as false positives.
+      error_rate: float False positive rate of the bloom filter.
+    """
+    self.deduplicator = Deduplicator(capacity=capacity, bloom=bloom, error_rate=error_rate)
+    return self.deduplicator
+
+
+  def disable_client_dedup(self):
+    self.deduplicator = None
+
+
+  def find_source(self, name: str, directory: str = None, cache: SourceCache = None, refresh: bool = False):
     """
       Search for a source within a project by name and (optionally) directory.
       If directory is not provided, the default directory is used (typically "Uploads").
+
+      If a SourceCache is passed, a source already in the cache is returned without a request,
+      unless refresh is True. Fetched sources are added to the cache.
     """
-    res = self.__api.get_request(
-      endpoints.Source.get_source_by_path(
-        owner_name=self.__api.default_owner['groupName'],
-        project_name=self.name,
-        directory_name=directory or self.default_dir,
-        source_ref_name=name
-      )
+    source_path = endpoints.Source.get_source_by_path(
+      owner_name=self.__api.default_owner['groupName'],
+      project_name=self.name,
+      directory_name=directory or self.default_dir,
+      source_ref_name=name
     )
 
-    return res.json()
+    if (cache is not None and not refresh):
+      source_id = cache.resolve(source_path)
+      source = cache.get_source_response(source_id) if source_id is not None else None
+      if (source is not None):
+        return source
+
+    res = self.__api.get_request(source_path)
+    source = res.json()
+
+    if (cache is not None):
+      try:
+        cache.put_source_response(source, path=source_path)
+      except Exception as e:
+        logging.warning(f'Unable to cache source {name}: {e}')
+
+    return source
+
+
+  def text_bounds_index(self, name: str, directory: str = None, cache: SourceCache = None) -> TextBoundsIndex:
+    """
+      Builds a TextBoundsIndex from a pdf source's text bounds, to fill in the page, text_bounds and bbox
+      of annotations from their offsets. Requires numpy: pip install annolab[geometry]
+    """
+    return TextBoundsIndex.from_source(self.find_source(name, directory=directory, cache=cache))
 
 
   def create_text_source(self, name: str, text: str, directory: str = None):
@@ -83,11 +141,19 @@ class Project:
     preprocessor: str = 'none',
     timeout: float = 30.0,
     metadata: dict = None,
+    skip_duplicates: bool = False,
+    upload_manifest: UploadManifest = None,
     **params: dict):
     """
       Creates a pdf source from a local file, bytes, or filelike object.
       If directory is not provided, the default directory is used (typically "Uploads").
       Will OCR using your account preferred OCR if ocr parameter is set to True (Org only)
+
+      With skip_duplicates, the file's sha256 is computed before uploading. If the same content was
+      already uploaded to this directory and name according to upload_manifest, or a source with this name
+      already exists with the same content hash, the upload is skipped and the existing source is returned.
+      Identical content under another name or directory is uploaded as a new source.
+      The hash is stored in the source's metadata as contentHash.
     """
     is_io_or_bytes = isinstance(file, io.IOBase) or isinstance(file, bytes)
     if (is_io_or_bytes and name is None):
@@ -95,6 +161,16 @@ class Project:
 
     name = name or path.basename(file)
 
+    content_hash = None
+    if (skip_duplicates):
+      content_hash = hash_file(file)
+      existing = self.__find_uploaded_pdf(content_hash, name, directory, upload_manifest)
+      if (existing is not None):
+        logging.info(f'Skipping upload of {name}, identical content was already uploaded.')
+        return existing
+
+      metadata = { **(metadata or {}), 'contentHash': content_hash }
+
     init_res = self.__api.post_request(
       endpoints.Source.post_initialize_pdf(),
       {
@@ -134,6 +210,9 @@ class Project:
       timeout=timeout
     )
 
+    if (content_hash is not None and upload_manifest is not None):
+      upload_manifest.add(self.id, content_hash, directory or self.default_dir, name, create_res.json())
+
     return create_res.json()
 
 
@@ -157,10 +236,18 @@ class Project:
     annotations: List[Any],
     relations: List[Any] = [],
     dedup: bool = True,
-    directory: str = None):
+    directory: str = None,
+    chunk_size: int = 5000,
+    workers: int = 4):
     """
       Create annotations against a single source.
 
+      Calls with more than chunk_size annotations are split into chunks sent concurrently by up to
+      `workers` threads. Annotations connected by relations are kept in the same chunk where possible.
+      Relations spanning chunks are created with a bulk relation call once every chunk has been created.
+      If the api returns no id for an annotation of such a relation, for instance because preventDuplication
+      skipped it, the relation is not created and an Exception listing the client ids is raised at the end.
+
       Annotation parameters:
         type:       str  (Required)
         client_id:  str  (Optional, Required if passing relations)
@@ -176,21 +263,91 @@ class Project:
     """
     directory = directory or self.default_dir
 
-    res = self.__api.post_request(
-      endpoints.Source.post_annotations(self.owner_name, self.name, directory, source_name),
-      {
-        'annotations': list(map(Annotation.create_api_annotation, annotations)),
-        'relations': list(map(AnnotationRelation.create_api_relation, relations)),
-        'preventDuplication': dedup
-      })
+    api_annotations = list(map(Annotation.create_api_annotation, annotations))
+    api_relations = list(map(AnnotationRelation.create_api_relation, relations))
 
-    return res.json()
+    staged = None
+    if (self.deduplicator is not None):
+      api_annotations, api_relations, staged = self.__dedup_source_annotations(
+        api_annotations, api_relations, source_name, directory)
+
+    def post_chunk(chunk_annotations: List, chunk_relations: List):
+      res = self.__api.post_request(
+        endpoints.Source.post_annotations(self.owner_name, self.name, directory, source_name),
+        {
+          'annotations': chunk_annotations,
+          'relations': chunk_relations,
+          'preventDuplication': dedup
+        })
+
+      return res.json()
+
+    if (chunk_size is None or len(api_annotations) <= chunk_size):
+      result = post_chunk(api_annotations, api_relations)
+      self.__commit_dedup(staged)
+      return result
+
+    chunks, deferred_relations = partition_annotations(api_annotations, api_relations, chunk_size)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+      results = list(executor.map(lambda chunk: post_chunk(*chunk), chunks))
+
+    merged = self.__merge_chunk_results(results)
+
+    if (len(deferred_relations) > 0):
+      annotation_ids = {}
+      for atn in (merged if isinstance(merged, list) else merged.get('annotations', [])):
+        annotation_ids[str(atn.get('clientId'))] = atn.get('id')
+
+      resolved_relations = []
+      unresolved_relations = []
+      for rln in deferred_relations:
+        predecessor_id = annotation_ids.get(rln['predecessorId'])
+        successor_id = annotation_ids.get(rln['successorId'])
+        if (predecessor_id is None or successor_id is None):
+          unresolved_relations.append(rln)
+          continue
+
+        rln['predecessorId'] = str(predecessor_id)
+        rln['successorId'] = str(successor_id)
+        rln['projectIdentifier'] = self.id
+        resolved_relations.append(rln)
+
+      if (len(resolved_relations) > 0):
+        res = self.__api.post_request(
+          endpoints.AnnotationRelation.post_bulk_create(),
+          {
+            'relations': resolved_relations,
+            'preventDuplication': dedup
+          }
+        )
+
+        if (isinstance(merged, dict)):
+          merged.setdefault('relations', []).extend(res.json())
+
+      self.__commit_dedup(staged)
+
+      if (len(unresolved_relations) > 0):
+        client_ids = [[rln['predecessorId'], rln['successorId']] for rln in unresolved_relations]
+        raise Exception(
+          f'Unable to create {len(unresolved_relations)} relations spanning chunks, the api returned no id for '
+          f'their annotations (e.g. duplicates skipped by preventDuplication): {client_ids}. '
+          'The annotations and all other relations were created.')
+
+      return merged
+
+    self.__commit_dedup(staged)
+
+    return merged
 
 
   def create_bulk_annotations(
     self,
-    annotations: List[Any],
+    annotations: Iterable[Any],
     dedup = True,
+    encoded: bool = False,
+    stream: bool = None,
+    fields: List[str] = None,
   ):
     """
       Create bulk annotations against one or more sources.
@@ -210,22 +367,57 @@ class Project:
         page:      int  (Optional) Required for classification annotations.
         end_page   int  (Optional) Required for classification annotations.
         reviewed   bool (Optional)
+
+      Pass encoded=True if the annotations have already been mapped with Annotation.create_api_annotation.
+
+      annotations may be any iterable, such as a generator. When stream is True, annotations are encoded
+      as the request body is sent, with chunked transfer encoding, so memory use does not grow with the
+      number of annotations. stream defaults to True for anything other than a list or tuple.
+
+      Pass fields, e.g. ['clientId', 'id'], to keep only those fields of each created annotation. The response
+      is then decoded incrementally, without holding the created annotations in memory.
     """
-    res = self.__api.post_request(
-      endpoints.Annotation.post_bulk_create(),
-      {
-        'annotations': list(map(Annotation.create_api_annotation, annotations)),
-        'preventDuplication': dedup
-      }
-    )
+    if (stream is None):
+      stream = not isinstance(annotations, (list, tuple))
 
-    return res.json()
+    api_annotations = annotations if encoded else map(Annotation.create_api_annotation, annotations)
+
+    staged = None
+    if (self.deduplicator is not None):
+      staged = ({}, [0])
+      api_annotations = (atn for atn in api_annotations if self.__stage_dedup(atn, staged))
+
+    response_options = self.__response_options(fields)
+
+    if (stream):
+      res = self.__api.post_stream_request(
+        endpoints.Annotation.post_bulk_create(),
+        iter_json_body({ 'preventDuplication': dedup }, 'annotations', api_annotations),
+        **response_options
+      )
+    else:
+      res = self.__api.post_request(
+        endpoints.Annotation.post_bulk_create(),
+        {
+          'annotations': list(api_annotations),
+          'preventDuplication': dedup
+        },
+        **response_options
+      )
+
+    result = self.__read_response(res, fields)
+    self.__commit_dedup(staged)
+
+    return result
 
 
   def create_bulk_relations(
     self,
-    relations: List[Any],
-    dedup = True
+    relations: Iterable[Any],
+    dedup = True,
+    encoded: bool = False,
+    stream: bool = None,
+    fields: List[str] = None
   ):
     """
     Create bulk relations against one or more sources.
@@ -237,16 +429,35 @@ class Project:
       value:            str  (Optional)
       reviewed          bool (Optional)
       project           Union[str, int]
+
+    Pass encoded=True if the relations have already been mapped with AnnotationRelation.create_api_relation.
+
+    relations may be any iterable. See create_bulk_annotations for the behavior of stream and fields.
     """
-    res = self.__api.post_request(
-      endpoints.AnnotationRelation.post_bulk_create(),
-      {
-        'relations': list(map(AnnotationRelation.create_api_relation, relations)),
-        'preventDuplication': dedup
-      }
-    )
+    if (stream is None):
+      stream = not isinstance(relations, (list, tuple))
 
-    return res.json()
+    api_relations = relations if encoded else map(AnnotationRelation.create_api_relation, relations)
+
+    response_options = self.__response_options(fields)
+
+    if (stream):
+      res = self.__api.post_stream_request(
+        endpoints.AnnotationRelation.post_bulk_create(),
+        iter_json_body({ 'preventDuplication': dedup }, 'relations', api_relations),
+        **response_options
+      )
+    else:
+      res = self.__api.post_request(
+        endpoints.AnnotationRelation.post_bulk_create(),
+        {
+          'relations': list(api_relations),
+          'preventDuplication': dedup
+        },
+        **response_options
+      )
+
+    return self.__read_response(res, fields)
 
 
   def create_annotation_type(self, name: str, **kargs):
@@ -305,36 +516,95 @@ class Project:
     include_annotation_types: bool = False,
     include_sources: bool = False,
     include_text_bounds: bool = False,
-    timeout: int = 3600
+    timeout: int = 3600,
+    shards: int = None,
+    workers: int = 4,
+    merge: bool = True
   ):
-    body = {
-      'projectIdentifier': self.name,
-      'groupName' : self.owner_name,
-      'includeAnnotationTypes': include_annotation_types,
-      'includeSources': include_sources,
-      'includeTextBounds': include_text_bounds
+    """
+      Exports the project to filepath.
+
+      Passing shards splits source_ids into that many export jobs, run and downloaded concurrently by
+      up to `workers` threads. With merge=True (the default) the shards are merged into a single export
+      archive at filepath; otherwise filepath is a directory the shard archives are downloaded to.
+    """
+    options = {
+      'source_ids': source_ids,
+      'layers': layers,
+      'include_annotation_types': include_annotation_types,
+      'include_sources': include_sources,
+      'include_text_bounds': include_text_bounds
     }
 
-    if (source_ids is not None): body['sourceIds'] = source_ids
-    if (layers is not None): body['annotationLayerNames'] = layers
+    if (shards is not None and shards > 1):
+      export = ShardedProjectExport(self.__api, self, options, shards=shards, workers=workers)
+      return export.download_on_finish(filepath, timeout=timeout, merge=merge)
 
-    export = ProjectExport(
-      self.__api,
-      self,
-      {
-        'source_ids': source_ids,
-        'layers': layers,
-        'include_annotation_types': include_annotation_types,
-        'include_sources': include_sources,
-        'include_text_bounds': include_text_bounds
-      })
+    export = ProjectExport(self.__api, self, options)
 
     export.start()
     export.download_on_finish(filepath, timeout=timeout)
 
 
-  def update_from_export(self, filepath: str, skip_sources=False):
-    project_import = ProjectImport(filepath, self, self.owner_name)
+  def update_from_export(
+    self,
+    filepath: str,
+    skip_sources=False,
+    manifest_path: str = None,
+    baseline_export: str = None,
+    workers: int = 4,
+    dead_letter_path: str = None,
+    batch_size: int = None,
+    parse_workers: int = None
+  ):
+    """
+      Imports the contents of an export into this project, with up to `workers` concurrent requests.
+      Records the api rejects are written to dead_letter_path, by default <filepath>.rejected.jsonl.
+      batch_size and parse_workers override the ProjectImport defaults for this update.
+
+      Passing a manifest_path and/or baseline_export makes the update differential: annotations
+      and relations are fingerprinted by content and only new or changed records are uploaded.
+        manifest_path:   str (Optional) Manifest written by a previous sync. Updated after this sync.
+        baseline_export: str (Optional) Previously imported export to diff against.
+                         Takes precedence over the contents of an existing manifest, whose ids are
+                         kept for annotations that are in both.
+
+      An export carries no ids of the annotations created in this project, so new or changed relations
+      between annotations only known from baseline_export cannot be created. They are skipped, counted
+      as missing_ids in the summary and listed in the ProjectImport's missing_id_relations. Relations to
+      annotations recorded by a manifest written by a previous sync are created as usual.
+
+      Returns the ProjectImport's report: { 'summary', 'sync', 'rejects', 'unresolved_relations', 'missing_id_relations' },
+      where summary counts the annotations and relations uploaded and sync is the summary of the diff
+      for differential updates, otherwise None.
+    """
+    manifest = None
+    if (baseline_export is not None):
+      baseline_import = ProjectImport(
+        baseline_export, self, self.owner_name, batch_size=batch_size, parse_workers=parse_workers)
+      baseline_import.unzip_export()
+      baseline_import.create_source_map()
+      manifest = baseline_import.create_manifest()
+      baseline_import.cleanup()
+
+      if (manifest_path is not None):
+        previous = SyncManifest(manifest_path)
+        for fingerprint in manifest.annotations.keys() & previous.annotations.keys():
+          manifest.annotations[fingerprint] = previous.annotations[fingerprint]
+        for fingerprint in manifest.relations.keys() & previous.relations.keys():
+          manifest.relations[fingerprint] = previous.relations[fingerprint]
+      manifest.filepath = manifest_path
+    elif (manifest_path is not None):
+      manifest = SyncManifest(manifest_path)
+
+    project_import = ProjectImport(
+      filepath,
+      self,
+      self.owner_name,
+      dead_letter_path=dead_letter_path,
+      batch_size=batch_size,
+      parse_workers=parse_workers
+    )
 
     project_import.unzip_export()
 
@@ -342,13 +612,141 @@ class Project:
       project_import.import_annotation_types()
       project_import.import_layers()
       project_import.create_source_map()
-      project_import.import_annotations()
-      project_import.import_relations()
+      project_import.import_annotations_and_relations(manifest, workers=workers)
     else:
-      project_import.import_all()
+      project_import.import_all(manifest, workers=workers)
 
     project_import.cleanup()
 
+    if (manifest is not None and manifest.filepath is not None):
+      manifest.save()
+
+    return project_import.report
+
+
+  def __response_options(self, fields: List[str]):
+    if (fields is None):
+      return {}
+
+    return { 'stream_response': True }
+
+
+  def __read_response(self, res, fields: List[str]):
+    if (fields is None):
+      return res.json()
+
+    return list(self.__api.iter_response_items(res, fields))
+
+
+  def __find_uploaded_pdf(self, content_hash: str, name: str, directory: str, upload_manifest: UploadManifest):
+    if (upload_manifest is not None):
+      entry = upload_manifest.find(self.id, content_hash, directory or self.default_dir, name)
+      if (entry is not None):
+        return entry['source']
+
+    try:
+      source = self.find_source(name, directory)
+    except HTTPError as e:
+      if (e.response.status_code == HTTPStatus.NOT_FOUND):
+        return None
+      raise e
+
+    if ((source.get('metadata') or {}).get('contentHash') == content_hash):
+      return source
+
+    return None
+
+
+  def __scoped_annotation(self, api_annotation: Dict, source_name: str = None, directory: str = None):
+    scoped = dict(api_annotation)
+    scoped.setdefault('sourceIdentifier', source_name)
+    scoped.setdefault('directoryIdentifier', directory or self.default_dir)
+    return scoped
+
+
+  def __dedup_source_annotations(self, api_annotations: List, api_relations: List, source_name: str, directory: str):
+    """
+      Drops duplicate annotations for a single source. Relations pointing at an annotation dropped as
+      a duplicate within this call are repointed at the annotation that was kept. Annotations referenced
+      by relations are never dropped as duplicates of an earlier call, since their relations could not be
+      repointed.
+    """
+    referenced = set()
+    for rln in api_relations:
+      referenced.add(rln['predecessorId'])
+      referenced.add(rln['successorId'])
+
+    kept_in_call = {}
+    replaced_ids = {}
+    deduped = []
+
+    for atn in api_annotations:
+      fingerprint = annotation_fingerprint(self.__scoped_annotation(atn, source_name, directory))
+      client_id = atn.get('clientId')
+      is_referenced = client_id in referenced
+
+      if (fingerprint in kept_in_call):
+        kept_id = kept_in_call[fingerprint].get('clientId')
+        if (not is_referenced or kept_id is not None):
+          if (is_referenced):
+            replaced_ids[client_id] = kept_id
+          continue
+      elif (fingerprint in self.deduplicator and not is_referenced):
+        continue
+
+      kept_in_call.setdefault(fingerprint, atn)
+      deduped.append(atn)
+
+    for rln in api_relations:
+      rln['predecessorId'] = replaced_ids.get(rln['predecessorId'], rln['predecessorId'])
+      rln['successorId'] = replaced_ids.get(rln['successorId'], rln['successorId'])
+
+    staged = (kept_in_call, [len(api_annotations) - len(deduped)])
+
+    return deduped, api_relations, staged
+
+
+  def __stage_dedup(self, api_annotation: Dict, staged):
+    """
+      Returns False for an annotation already accepted by the api or already sent in this call.
+      Otherwise stages its fingerprint, to be committed once the call succeeds.
+    """
+    fingerprints, dropped = staged
+    fingerprint = annotation_fingerprint(self.__scoped_annotation(api_annotation))
+
+    if (fingerprint in fingerprints or fingerprint in self.deduplicator):
+      dropped[0] += 1
+      return False
+
+    fingerprints[fingerprint] = None
+    return True
+
+
+  def __commit_dedup(self, staged):
+    """Records the fingerprints of a successful call in the deduplicator, with the duplicates it dropped."""
+    if (staged is None or self.deduplicator is None):
+      return
+
+    fingerprints, dropped = staged
+    self.deduplicator.commit(fingerprints.keys(), dropped=dropped[0])
+    logging.info(f'Client dedup dropped {dropped[0]} duplicate annotations')
+
+
+  def __merge_chunk_results(self, results: List):
+    """Combines the responses of chunked annotation calls into the shape of a single response."""
+    if (all(isinstance(result, list) for result in results)):
+      return [item for result in results for item in result]
+
+    merged = {}
+    for result in results:
+      for key, value in result.items():
+        if (isinstance(value, list)):
+          merged.setdefault(key, []).extend(value)
+        else:
+          merged.setdefault(key, value)
+
+    return merged
+
 
   @staticmethod
   def create_from_response_json(resp_json: Dict, api_helper: ApiHelper):
@@ -1,7 +1,13 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import json
 from logging import Logger
+import os
+import re
 import requests
 import shutil
+import tempfile
+import zipfile
 
 from annolab.api_helper import ApiHelper
 from annolab import endpoints
@@ -51,6 +57,9 @@ class ProjectExport:
       timeout=timeout
     )
 
+    if (self.last_status == ExportStatus.errored.value):
+      raise Exception(f'Export of project {self.project.name} failed: {self.error}')
+
     with requests.get(self.download_url, stream=True) as r:
       with open(filepath, 'wb') as f:
         shutil.copyfileobj(r.raw, f)
@@ -66,9 +75,9 @@ class ProjectExport:
     }
 
     if (self.options.get('source_ids', None) is not None):
-      body['sourceIds'] = self.options.source_ids
+      body['sourceIds'] = self.options['source_ids']
     if (self.options.get('layers', None) is not None):
-      body['annotationLayerNames'] = self.options.layers
+      body['annotationLayerNames'] = self.options['layers']
 
     res = self.__api.post_request(
       endpoints.Export.post_export_project(),
@@ -98,3 +107,129 @@ class ProjectExport:
 
     return self.last_status
 
+
+
+class ShardedProjectExport:
+  """
+    Exports a project as several concurrent export jobs, each covering a slice of options['source_ids'].
+    Shards are started, polled and downloaded in parallel, by up to `workers` threads.
+
+    With merge=True, the shards' jsonl files are concatenated into a single export archive at filepath,
+    laid out like a regular export, so it can be passed to ProjectImport. Annotation types and layers
+    (and relations exported by more than one shard) are deduplicated. With merge=False, filepath is a
+    directory the shard archives are left in, each a complete export of its sources.
+  """
+
+  # Export entity files that are merged by concatenation. Lines of the deduplicated ones are only
+  # written once, since every shard exports them.
+  entity_patterns = [
+    (r'.*\.sources\.jsonl', False),
+    (r'.*\.text-bounds\.jsonl', False),
+    (r'.*\.annotations\.jsonl', False),
+    (r'.*\.relations\.jsonl', True),
+    (r'.*\.layers\.jsonl', True),
+    (r'.*\.atntypes\.jsonl', True),
+  ]
+
+  def __init__(
+    self,
+    api_helper: ApiHelper,
+    project,
+    options: dict,
+    shards: int = 4,
+    workers: int = 4
+  ):
+    if (not options.get('source_ids')):
+      raise Exception('Sharded exports require source_ids to split the project by.')
+
+    source_ids = options['source_ids']
+    shards = max(1, min(shards, len(source_ids)))
+    shard_size = -(-len(source_ids) // shards)
+
+    self.exports = [
+      ProjectExport(api_helper, project, { **options, 'source_ids': source_ids[start:start + shard_size] })
+      for start in range(0, len(source_ids), shard_size)
+    ]
+    self.workers = workers
+
+
+  def download_on_finish(self, filepath: str, timeout=3600, merge: bool = True):
+    """
+      Runs every shard's export and downloads it. Returns filepath, or the shard archive paths
+      when merge is False.
+    """
+    if (merge):
+      shard_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(filepath)))
+    else:
+      shard_dir = filepath
+      os.makedirs(shard_dir, exist_ok=True)
+
+    shard_paths = [os.path.join(shard_dir, f'shard-{index:03d}.zip') for index in range(len(self.exports))]
+
+    try:
+      with ThreadPoolExecutor(max_workers=self.workers) as executor:
+        futures = [
+          executor.submit(export.download_on_finish, shard_path, timeout)
+          for export, shard_path in zip(self.exports, shard_paths)
+        ]
+        for future in futures:
+          future.result()
+
+      if (not merge):
+        return shard_paths
+
+      self.__merge(shard_paths, filepath)
+      return filepath
+    finally:
+      if (merge):
+        shutil.rmtree(shard_dir, ignore_errors=True)
+
+
+  def __merge(self, shard_paths, filepath: str):
+    archives = [zipfile.ZipFile(shard_path) for shard_path in shard_paths]
+
+    try:
+      with zipfile.ZipFile(filepath, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as merged:
+        for pattern, dedup in self.entity_patterns:
+          members = [
+            (archive, name) for archive in archives for name in archive.namelist()
+            if re.match(pattern, os.path.basename(name)) is not None
+          ]
+          if (len(members) > 0):
+            self.__merge_jsonl(merged, members[0][1], members, dedup)
+
+        # Everything else, such as pdfs under <directoryName>/<sourceName>, belongs to a single shard.
+        written = set(merged.namelist())
+        for archive in archives:
+          for info in archive.infolist():
+            if (info.is_dir() or info.filename in written):
+              continue
+            written.add(info.filename)
+            with archive.open(info) as src, merged.open(info.filename, 'w', force_zip64=True) as dst:
+              shutil.copyfileobj(src, dst, 1024 * 1024)
+    finally:
+      for archive in archives:
+        archive.close()
+
+    logger.info(f'Merged {len(shard_paths)} export shards into {filepath}')
+
+
+  def __merge_jsonl(self, merged: zipfile.ZipFile, name: str, members, dedup: bool):
+    seen = set()
+
+    with merged.open(name, 'w', force_zip64=True) as dst:
+      for archive, member in members:
+        with archive.open(member) as src:
+          for line in src:
+            if (not line.strip()):
+              continue
+            if (not line.endswith(b'\n')):
+              line += b'\n'
+
+            if (dedup):
+              key = hashlib.blake2b(line, digest_size=16).digest()
+              if (key in seen):
+                continue
+              seen.add(key)
+
+            dst.write(line)
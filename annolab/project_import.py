@@ -1,9 +1,13 @@
 from http import HTTPStatus
+import json
 from logging import Logger
 import os
 import re
 import shutil
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from unicodedata import category
 from uuid import uuid4
 from typing import Union, List
@@ -11,10 +15,66 @@ from typing import Union, List
 import jsonlines
 from requests.exceptions import HTTPError
 
+from annolab.annotation import Annotation
+from annolab.annotation_relation import AnnotationRelation
+from annolab.relation_scheduler import RelationScheduler
+from annolab.sync_manifest import SyncManifest
+from annolab.upload_manifest import UploadManifest
+from annolab.util.fingerprint import annotation_fingerprint, relation_fingerprint
+from annolab.util.json_stream import encode_json_default
+from annolab.util.jsonl_reader import read_batches
+
 logger = Logger(__name__)
 
+
+def encode_export_annotation(source_map: dict, project_id: int, with_fingerprint: bool, annotation: dict):
+  """
+    Maps an exported annotation to an (api annotation, fingerprint) pair, or None if its source was not imported.
+    The fingerprint is None unless with_fingerprint is set.
+    Module level so it can be applied in jsonl reader worker processes.
+  """
+  source = source_map.get(annotation.get('sourceId'), None)
+  if (source is None):
+    logger.info(f'Skipping annotation for source {annotation.get("sourceId")}, source has not been imported.')
+    return None
+
+  sourceName = source[0]
+  dirName = source[1]
+
+  api_annotation = Annotation.create_api_annotation({
+    'type': annotation.get('typeName'),
+    'value': annotation.get('value'),
+    'offsets': annotation.get('offsets'),
+    'text_bounds': annotation.get('textBounds'),
+    'image_bounds': annotation.get('imageBounds'),
+    'client_id': annotation.get('id'),
+    'layer': annotation.get('layerName'),
+    'page': annotation.get('pageNumber'),
+    'endPage': annotation.get('endPageNumber'),
+    'source': sourceName,
+    'directory': dirName,
+    'project': project_id
+  })
+
+  return api_annotation, annotation_fingerprint(api_annotation) if with_fingerprint else None
+
+
 class ProjectImport:
 
+  # Number of records sent per bulk create request.
+  batch_size = 500
+  # Number of processes used to parse the export's jsonl files. Files are parsed in the importing process
+  # by default. Processes are spawned, so only raise this from scripts guarded by if __name__ == '__main__'.
+  parse_workers: int = 1
+  # When set, pdfs whose content was already uploaded to the project are not uploaded again.
+  upload_manifest: UploadManifest = None
+  # Records the api rejects are appended here. Defaults to <export filepath>.rejected.jsonl.
+  dead_letter_path: str = None
+  # Client error statuses not caused by the records sent. These abort the import instead of isolating rejects.
+  abort_statuses = (HTTPStatus.UNAUTHORIZED, HTTPStatus.FORBIDDEN, HTTPStatus.REQUEST_TIMEOUT, HTTPStatus.TOO_MANY_REQUESTS)
+  # The import is aborted when more records than this are rejected from a single batch.
+  max_rejects_per_batch = 50
+
   source_file: str = None
   bounds_file: str = None
   annotations_file: str = None
@@ -22,20 +82,58 @@ class ProjectImport:
   relations_file: str = None
   atntypes_file: str = None
 
-  # Maps original source id to source name + directory
-  source_map: dict = {}
-  annotation_map: dict = {}
-
   def __init__(
     self,
     export_filepath: str,
     project,
-    groupId: Union[str, int]
+    groupId: Union[str, int],
+    dead_letter_path: str = None,
+    batch_size: int = None,
+    parse_workers: int = None
   ):
     self.export_filepath = export_filepath
     self.project = project
     self.groupId = groupId
     self.unpack_target_dir = os.path.join(tempfile.gettempdir(), str(uuid4()))
+    # Arguments override the class attributes for this import only.
+    if (dead_letter_path is not None):
+      self.dead_letter_path = dead_letter_path
+    if (batch_size is not None):
+      self.batch_size = batch_size
+    if (parse_workers is not None):
+      self.parse_workers = parse_workers
+
+    # Maps original source id to source name + directory
+    self.source_map = {}
+    self.annotation_map = {}
+    # Maps original annotation id to content fingerprint. Only populated for differential imports.
+    self.fingerprint_map = {}
+    # Ids of exported relations skipped because their annotations were not imported.
+    self.unresolved_relations = []
+    # Ids of exported relations skipped because an annotation is unchanged since a baseline export,
+    # which does not record the annotation's id in this project.
+    self.missing_id_relations = []
+    # Counts of the annotations and relations read, uploaded and rejected, set by the annotation and relation imports.
+    self.summary = {}
+    self.sync_summary = None
+    # Counts and details of the records rejected by the api, set by the annotation and relation imports.
+    self.reject_report = None
+    self.__dead_letter_lock = threading.Lock()
+
+
+  @property
+  def report(self):
+    """
+      Summary of the import: the counts of annotations and relations, the sync summary of a differential
+      import (otherwise None), the reject report, and the ids of exported relations that were skipped.
+    """
+    return {
+      'summary': self.summary,
+      'sync': self.sync_summary,
+      'rejects': self.reject_report,
+      'unresolved_relations': self.unresolved_relations,
+      'missing_id_relations': self.missing_id_relations,
+    }
 
 
   def unzip_export(self):
@@ -46,12 +144,11 @@ class ProjectImport:
     self.__find_entity_files()
 
 
-  def import_all(self):
+  def import_all(self, manifest: SyncManifest = None, workers: int = 4):
     self.import_sources()
     self.import_annotation_types()
     self.import_layers()
-    self.import_annotations()
-    self.import_relations()
+    self.import_annotations_and_relations(manifest, workers)
 
 
   def cleanup(self):
@@ -108,73 +205,64 @@ class ProjectImport:
             raise e
 
 
-  def import_annotations(self):
-    batch_size = 500
-    annotations_filepath = os.path.join(self.unpack_target_dir, self.annotations_file)
+  def import_annotations(self, manifest: SyncManifest = None, workers: int = 1):
+    """
+      Imports annotations from the export in batches.
+
+      When a manifest is passed, only annotations whose content fingerprint is not in the manifest
+      are uploaded, and the manifest is updated to reflect the annotations in this export.
 
-    batch = []
+      A batch the api rejects with a client error is split until the rejected annotations are isolated.
+      Those are written to dead_letter_path and listed in reject_report, and the import carries on.
+      An error that looks systematic rather than caused by a few records aborts the import instead.
+    """
+    self.__run_import(manifest, workers, include_annotations=True, include_relations=False)
 
-    def insert_batch(batch: List):
-      created = self.project.create_bulk_annotations(batch, dedup=True)
-      for atn in created:
-        self.annotation_map[str(atn.get('clientId'))] = atn
 
-    with jsonlines.open(annotations_filepath) as annotations:
-      for annotation in annotations:
-        source = self.source_map.get(annotation.get('sourceId'), None)
-        if (source is None):
-          logger.info(f'Skipping annotation for source {annotation.get("sourceId")}, source has not been imported.')
-          continue
+  def import_relations(self, manifest: SyncManifest = None, workers: int = 1):
+    """
+      Imports relations from the export in batches. Must be run after import_annotations.
 
-        sourceName = source[0]
-        dirName = source[1]
-
-        batch.append({
-          'type': annotation.get('typeName'),
-          'value': annotation.get('value'),
-          'offsets': annotation.get('offsets'),
-          'text_bounds': annotation.get('textBounds'),
-          'image_bounds': annotation.get('imageBounds'),
-          'client_id': annotation.get('id'),
-          'layer': annotation.get('layerName'),
-          'page': annotation.get('pageNumber'),
-          'endPage': annotation.get('endPageNumber'),
-          'source': sourceName,
-          'directory': dirName,
-          'project': self.project.id
-        })
-        if (len(batch) >= batch_size):
-          insert_batch(batch)
-          batch=[]
-
-    # Insert final batch
-    if (len(batch) > 0):
-      insert_batch(batch)
-
-
-  def import_relations(self):
-    batch_size = 500
-    relations_filepath = os.path.join(self.unpack_target_dir, self.relations_file)
-    batch = []
+      Relations whose annotations were not imported are skipped and their ids recorded in
+      unresolved_relations. When a manifest is passed, relations already present in the manifest
+      are skipped. Rejected relations are isolated as in import_annotations.
+    """
+    self.__run_import(manifest, workers, include_annotations=False, include_relations=True)
 
-    with jsonlines.open(relations_filepath) as relations:
+
+  def import_annotations_and_relations(self, manifest: SyncManifest = None, workers: int = 4):
+    """
+      Imports annotations and relations concurrently, using up to `workers` requests of each.
+      Each relation is uploaded as soon as both of its annotations have been created, rather than
+      after the whole annotations file has been imported.
+    """
+    self.__run_import(manifest, workers, include_annotations=True, include_relations=True)
+
+
+  def create_manifest(self) -> SyncManifest:
+    """
+      Builds a sync manifest from the contents of this export, for use as the baseline of a
+      differential import. Requires the export to be unzipped and the source map to be created.
+    """
+    manifest = SyncManifest()
+
+    for records in self.__read_annotations(with_fingerprint=True):
+      for api_annotation, fingerprint in records:
+        self.fingerprint_map[api_annotation['clientId']] = fingerprint
+        manifest.annotations[fingerprint] = None
+
+    for relations in self.__read_relations():
       for rln in relations:
-        batch.append({
-          'annotations': [
-            self.annotation_map.get(str(rln.get('predecessorId'))).get('id'),
-            self.annotation_map.get(str(rln.get('successorId'))).get('id')
-          ],
-          'type': rln.get('typeName'),
-          'value': rln.get('value'),
-          'project': self.project.id
-        })
-        if (len(batch) >= batch_size):
-          self.project.create_bulk_relations(batch, dedup=True)
-          batch = []
-
-    # Insert final batch
-    if (len(batch) > 0):
-      self.project.create_bulk_relations(batch, dedup=True)
+        predecessor_fingerprint = self.fingerprint_map.get(str(rln.get('predecessorId')))
+        successor_fingerprint = self.fingerprint_map.get(str(rln.get('successorId')))
+        if (predecessor_fingerprint is None or successor_fingerprint is None):
+          continue
+
+        api_relation = { 'annoTypeIdentifier': rln.get('typeName'), 'value': rln.get('value') }
+        fingerprint = relation_fingerprint(api_relation, predecessor_fingerprint, successor_fingerprint)
+        manifest.relations[fingerprint] = None
+
+    return manifest
 
 
   def create_source(self, source: dict):
@@ -193,6 +281,8 @@ class ProjectImport:
           source['sourceName'],
           source['directoryName'],
           ocr=False,
+          skip_duplicates=self.upload_manifest is not None,
+          upload_manifest=self.upload_manifest,
           sourceText=source['text'],
           textBounds=text_bounds['textBounds']
         )
@@ -203,6 +293,374 @@ class ProjectImport:
         raise e
 
 
+  def __run_import(self, manifest: SyncManifest, workers: int, include_annotations: bool, include_relations: bool):
+    lock = threading.Lock()
+    failed = threading.Event()
+    in_flight = threading.BoundedSemaphore(workers * 2)
+    scheduler = RelationScheduler()
+
+    # Annotations and relations are read at the same time, so the parse processes are split between them.
+    annotation_parse_workers = relation_parse_workers = self.parse_workers or os.cpu_count() or 1
+    if (include_annotations and include_relations):
+      annotation_parse_workers = max(1, annotation_parse_workers - annotation_parse_workers // 2)
+      relation_parse_workers = max(1, relation_parse_workers // 2)
+
+    annotation_summary = { 'total': 0, 'uploaded': 0, 'unchanged': 0, 'removed': 0, 'rejected': 0 }
+    relation_summary = {
+      'total': 0, 'uploaded': 0, 'unchanged': 0, 'removed': 0, 'unresolved': 0, 'missing_ids': 0, 'rejected': 0
+    }
+    rejects = []
+    seen_annotations = {}
+    seen_relations = {}
+    relation_batch = []
+    annotation_futures = []
+    relation_futures = []
+
+    annotation_pool = ThreadPoolExecutor(max_workers=workers)
+    relation_pool = ThreadPoolExecutor(max_workers=workers)
+    reader_pool = ThreadPoolExecutor(max_workers=1)
+
+    def flush_relations(force: bool = False):
+      nonlocal relation_batch
+      if (len(relation_batch) >= self.batch_size or (force and len(relation_batch) > 0)):
+        relation_futures.append(relation_pool.submit(insert_relations, relation_batch))
+        relation_batch = []
+
+    def insert_relations(batch: List):
+      insert = lambda records: self.project.create_bulk_relations(
+        [relation for relation, _, _ in records], dedup=True, fields=['id'])
+
+      for (relation, export_id, fingerprint), error in self.__isolate_rejects(insert, batch):
+        with lock:
+          relation_summary['uploaded'] -= 1
+          relation_summary['rejected'] += 1
+          if (fingerprint is not None):
+            seen_relations.pop(fingerprint, None)
+        self.__reject('relation', export_id, relation, error, rejects)
+
+    def release(ready: List[dict]):
+      if (not include_relations or len(ready) == 0):
+        return
+
+      with lock:
+        for rln in ready:
+          resolved = self.__resolve_relation(rln, manifest, seen_relations, relation_summary)
+          if (resolved is not None):
+            relation_batch.append((resolved[0], rln.get('id'), resolved[1]))
+            flush_relations()
+
+    def insert_annotations(batch: List, fingerprints: dict):
+      try:
+        created = []
+        insert = lambda records: created.extend(
+          self.project.create_bulk_annotations(records, dedup=True, encoded=True, fields=['clientId', 'id']))
+
+        for atn, error in self.__isolate_rejects(insert, batch):
+          with lock:
+            annotation_summary['rejected'] += 1
+          self.__reject('annotation', atn['clientId'], atn, error, rejects)
+
+        with lock:
+          for atn in created:
+            client_id = str(atn.get('clientId'))
+            self.annotation_map[client_id] = atn
+            if (client_id in fingerprints):
+              seen_annotations[fingerprints[client_id]] = atn.get('id')
+
+        release(scheduler.settle([atn['clientId'] for atn in batch]))
+      except:
+        failed.set()
+        raise
+      finally:
+        in_flight.release()
+
+    def submit_annotations(batch: List, fingerprints: dict):
+      in_flight.acquire()
+      annotation_futures.append(annotation_pool.submit(insert_annotations, batch, fingerprints))
+
+    def read_relations():
+      for relations in self.__read_relations(relation_parse_workers):
+        if (failed.is_set()):
+          break
+
+        with lock:
+          relation_summary['total'] += len(relations)
+        for rln in relations:
+          release(scheduler.add(rln, [str(rln.get('predecessorId')), str(rln.get('successorId'))]))
+
+    try:
+      if (not include_annotations):
+        scheduler.settle(list(self.annotation_map.keys()) + list(self.fingerprint_map.keys()))
+
+      if (include_relations):
+        relation_reader = reader_pool.submit(read_relations)
+
+      if (include_annotations):
+        batch = []
+        batch_fingerprints = {}
+
+        for records in self.__read_annotations(with_fingerprint=manifest is not None, parse_workers=annotation_parse_workers):
+          if (failed.is_set()):
+            break
+
+          for api_annotation, fingerprint in records:
+            annotation_summary['total'] += 1
+            client_id = api_annotation['clientId']
+
+            if (manifest is not None):
+              with lock:
+                self.fingerprint_map[client_id] = fingerprint
+                is_unchanged = fingerprint in manifest.annotations or fingerprint in seen_annotations
+                if (is_unchanged):
+                  id = manifest.annotations.get(fingerprint, seen_annotations.get(fingerprint))
+                  seen_annotations[fingerprint] = id
+                  if (id is not None):
+                    self.annotation_map[client_id] = { 'clientId': client_id, 'id': id }
+
+              if (is_unchanged):
+                annotation_summary['unchanged'] += 1
+                release(scheduler.settle([client_id]))
+                continue
+
+              batch_fingerprints[client_id] = fingerprint
+
+            batch.append(api_annotation)
+            # Counted by this thread alone. Rejected annotations are counted by the upload threads and
+            # taken off once they are done.
+            annotation_summary['uploaded'] += 1
+            if (len(batch) >= self.batch_size):
+              submit_annotations(batch, batch_fingerprints)
+              batch = []
+              batch_fingerprints = {}
+
+        # Insert final batch
+        if (len(batch) > 0 and not failed.is_set()):
+          submit_annotations(batch, batch_fingerprints)
+
+        for future in annotation_futures:
+          future.result()
+
+      if (include_relations):
+        relation_reader.result()
+
+        unresolved = scheduler.finish()
+        with lock:
+          for rln in unresolved:
+            self.unresolved_relations.append(rln.get('id'))
+          relation_summary['unresolved'] += len(unresolved)
+          flush_relations(force=True)
+
+        for future in relation_futures:
+          future.result()
+
+        if (relation_summary['unresolved'] > 0):
+          logger.warning(f'Skipped {relation_summary["unresolved"]} relations whose annotations were not imported.')
+        if (relation_summary['missing_ids'] > 0):
+          logger.warning(
+            f'Skipped {relation_summary["missing_ids"]} relations to annotations unchanged since the baseline, '
+            'whose ids in this project are unknown. Sync with a manifest written by a previous sync to create them.')
+    finally:
+      failed.set()
+      reader_pool.shutdown(wait=True)
+      annotation_pool.shutdown(wait=True)
+      relation_pool.shutdown(wait=True)
+      self.__update_reject_report(rejects)
+
+    annotation_summary['uploaded'] -= annotation_summary['rejected']
+    if (include_annotations):
+      self.summary['annotations'] = annotation_summary
+    if (include_relations):
+      self.summary['relations'] = relation_summary
+
+    if (manifest is not None and include_annotations):
+      annotation_summary['removed'] = len(manifest.annotations.keys() - seen_annotations.keys())
+      manifest.annotations = seen_annotations
+      self.__update_sync_summary('annotations', annotation_summary)
+
+    if (manifest is not None and include_relations):
+      relation_summary['removed'] = len(manifest.relations.keys() - seen_relations.keys())
+      manifest.relations = seen_relations
+      self.__update_sync_summary('relations', relation_summary)
+
+
+  def __resolve_relation(self, rln: dict, manifest: SyncManifest, seen: dict, summary: dict):
+    """
+      Maps an exported relation to an (sdk relation dict, fingerprint) pair using the ids of the imported
+      annotations. Returns None if the relation is unchanged since the manifest or its annotations were not imported.
+    """
+    predecessor_id = str(rln.get('predecessorId'))
+    successor_id = str(rln.get('successorId'))
+    relation = {
+      'annotations': [predecessor_id, successor_id],
+      'type': rln.get('typeName'),
+      'value': rln.get('value'),
+      'project': self.project.id
+    }
+
+    fingerprint = None
+    if (manifest is not None):
+      predecessor_fingerprint = self.fingerprint_map.get(predecessor_id)
+      successor_fingerprint = self.fingerprint_map.get(successor_id)
+
+      if (predecessor_fingerprint is not None and successor_fingerprint is not None):
+        fingerprint = relation_fingerprint(
+          AnnotationRelation.create_api_relation(relation),
+          predecessor_fingerprint,
+          successor_fingerprint
+        )
+        if (fingerprint in manifest.relations or fingerprint in seen):
+          seen[fingerprint] = manifest.relations.get(fingerprint, seen.get(fingerprint))
+          summary['unchanged'] += 1
+          return None
+
+    predecessor = self.annotation_map.get(predecessor_id)
+    successor = self.annotation_map.get(successor_id)
+    if (manifest is not None and (
+      (predecessor is None and self.__is_missing_id(predecessor_id, manifest)) or
+      (successor is None and self.__is_missing_id(successor_id, manifest)))):
+      self.missing_id_relations.append(rln.get('id'))
+      summary['missing_ids'] += 1
+      return None
+
+    if (predecessor is None or successor is None):
+      logger.info(f'Unable to resolve annotations for relation {rln.get("id")}. Skipping')
+      self.unresolved_relations.append(rln.get('id'))
+      summary['unresolved'] += 1
+      return None
+
+    relation['annotations'] = [predecessor.get('id'), successor.get('id')]
+    summary['uploaded'] += 1
+    if (fingerprint is not None):
+      seen[fingerprint] = None
+
+    return relation, fingerprint
+
+
+  def __isolate_rejects(self, insert, batch: List):
+    """
+      Calls insert with the batch. When the api rejects it as a client error, the batch is split in half
+      and each half retried, recursively, so that only the records rejected on their own are left out.
+      Returns those records, paired with the error they were rejected with.
+
+      Bisecting stops, and the error is raised, when both halves of a split, each of several records,
+      are rejected with the same error, or when more than max_rejects_per_batch records of the batch
+      are rejected, as the cause is then unlikely to be the records themselves.
+    """
+    error = self.__try_insert(insert, batch)
+    if (error is None):
+      return []
+
+    rejects = []
+    self.__bisect_rejects(insert, batch, error, rejects)
+    return rejects
+
+
+  def __bisect_rejects(self, insert, batch: List, error: HTTPError, rejects: List):
+    if (len(batch) == 1):
+      rejects.append((batch[0], error))
+      if (len(rejects) > self.max_rejects_per_batch):
+        raise Exception(f'The api rejected more than {self.max_rejects_per_batch} records of one batch: {error}') from error
+      return
+
+    middle = len(batch) // 2
+    halves = (batch[:middle], batch[middle:])
+    errors = [self.__try_insert(insert, half) for half in halves]
+
+    first, second = errors
+    if (len(batch) >= 4 and first is not None and second is not None and self.__same_error(first, second)):
+      raise Exception(f'The api rejected both halves of a batch with the same error: {first}') from first
+
+    for half, half_error in zip(halves, errors):
+      if (half_error is not None):
+        self.__bisect_rejects(insert, half, half_error, rejects)
+
+
+  def __try_insert(self, insert, batch: List):
+    """Returns the client error the api rejected the batch with, or None once it is inserted."""
+    try:
+      insert(batch)
+      return None
+    except HTTPError as e:
+      status = e.response.status_code if e.response is not None else None
+      if (status is None or status < 400 or status >= 500 or status in self.abort_statuses):
+        raise e
+      return e
+
+
+  def __same_error(self, first: HTTPError, second: HTTPError):
+    return first.response.status_code == second.response.status_code and str(first) == str(second)
+
+
+  def __reject(self, kind: str, export_id, record: dict, error: HTTPError, rejects: List):
+    entry = {
+      'kind': kind,
+      'id': export_id,
+      'status': error.response.status_code,
+      'error': str(error),
+    }
+
+    with self.__dead_letter_lock:
+      rejects.append(entry)
+      with open(self.__dead_letter_filepath(), 'a') as f:
+        f.write(json.dumps({ **entry, 'record': record }, default=encode_json_default) + '\n')
+
+    logger.warning(f'Rejected {kind} {export_id}: {error}')
+
+
+  def __dead_letter_filepath(self):
+    return self.dead_letter_path or f'{self.export_filepath}.rejected.jsonl'
+
+
+  def __update_reject_report(self, rejects: List):
+    if (self.reject_report is None):
+      self.reject_report = { 'annotations': 0, 'relations': 0, 'rejected': [], 'dead_letter_path': None }
+
+    self.reject_report['annotations'] += sum(1 for entry in rejects if entry['kind'] == 'annotation')
+    self.reject_report['relations'] += sum(1 for entry in rejects if entry['kind'] == 'relation')
+    self.reject_report['rejected'].extend(rejects)
+    if (len(rejects) > 0):
+      self.reject_report['dead_letter_path'] = self.__dead_letter_filepath()
+      logger.warning(
+        f'The api rejected {len(rejects)} records. They were written to {self.reject_report["dead_letter_path"]}')
+
+
+  def __is_missing_id(self, client_id: str, manifest: SyncManifest):
+    """Whether an exported annotation is unchanged since the manifest, but its id was not recorded."""
+    fingerprint = self.fingerprint_map.get(client_id)
+    return fingerprint is not None and fingerprint in manifest.annotations and manifest.annotations[fingerprint] is None
+
+
+  def __read_annotations(self, with_fingerprint: bool = False, parse_workers: int = None):
+    """
+      Yields batches of (api annotation, fingerprint) pairs from the annotations file,
+      parsed by parse_workers processes (defaults to the parse_workers attribute).
+    """
+    annotations_filepath = os.path.join(self.unpack_target_dir, self.annotations_file)
+    project_id = self.project.id if self.project is not None else None
+
+    return read_batches(
+      annotations_filepath,
+      batch_size=self.batch_size,
+      workers=parse_workers or self.parse_workers,
+      ordered=False,
+      transform=partial(encode_export_annotation, self.source_map, project_id, with_fingerprint)
+    )
+
+
+  def __read_relations(self, parse_workers: int = None):
+    """Yields batches of exported relations from the relations file."""
+    relations_filepath = os.path.join(self.unpack_target_dir, self.relations_file)
+
+    return read_batches(relations_filepath, batch_size=self.batch_size, workers=parse_workers or self.parse_workers, ordered=False)
+
+
+  def __update_sync_summary(self, key: str, summary: dict):
+    if (self.sync_summary is None):
+      self.sync_summary = {}
+
+    self.sync_summary[key] = summary
+
+
   def __find_entity_files(self):
     contents = os.listdir(self.unpack_target_dir)
     export_files = list(filter(lambda item: re.match('.*jsonl', item), contents))
@@ -0,0 +1,194 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from logging import Logger
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import List, Union
+
+from annolab.project_import import ProjectImport
+
+logger = Logger(__name__)
+
+
+class ProjectMigration:
+  """
+    Copies many projects into a target group as a pipeline: each project is exported and downloaded by
+    one pool of workers, then imported by another, so the phases of different projects overlap.
+
+    export_workers bounds the number of exports being generated or downloaded at once,
+    import_workers the number of projects being imported at once, and upload_workers the
+    concurrent bulk requests made by each import. max_archives bounds the export archives on disk,
+    downloading or waiting for import, defaulting to export_workers + import_workers: an export
+    only starts once an earlier archive has been imported and deleted.
+
+    Only exports, archives and imports are bounded across projects. Upload concurrency is per import:
+    each import makes up to upload_workers annotation requests and as many relation requests at once,
+    so up to import_workers * upload_workers * 2 requests are in flight. Pass a RateLimiter to AnnoLab
+    to keep the requests of every import under a shared budget.
+
+    Records the api rejects during an import are written to <dead_letter_dir>/<owner>-<project id>.rejected.jsonl,
+    by default in the current directory, and counted in the project's report.
+  """
+
+  def __init__(
+    self,
+    lab,
+    projects: List[Union[str, object]],
+    owner_name: str = None,
+    target_owner_name: str = None,
+    name_format: str = '{name}',
+    export_workers: int = 4,
+    import_workers: int = 2,
+    upload_workers: int = 4,
+    is_public: bool = False,
+    workdir: str = None,
+    timeout: int = 3600,
+    dead_letter_dir: str = None,
+    max_archives: int = None
+  ):
+    self.lab = lab
+    self.projects = projects
+    self.owner_name = owner_name
+    self.target_owner_name = target_owner_name
+    self.name_format = name_format
+    self.export_workers = export_workers
+    self.import_workers = import_workers
+    self.upload_workers = upload_workers
+    self.is_public = is_public
+    self.workdir = workdir
+    self.timeout = timeout
+    # Kept apart from workdir, which is deleted after a run when it is a temporary directory.
+    self.dead_letter_dir = dead_letter_dir or os.getcwd()
+    self.max_archives = max_archives or export_workers + import_workers
+
+
+  def run(self) -> List[dict]:
+    """
+      Migrates every project, returning one report per project in the order the projects were given.
+      A failure in one project is recorded in its report and does not stop the others.
+    """
+    workdir = self.workdir or tempfile.mkdtemp()
+    os.makedirs(workdir, exist_ok=True)
+
+    reports = [self.__create_report(project) for project in self.projects]
+    # Taken by an export before it starts, and given back once its archive is imported and deleted.
+    archives = threading.BoundedSemaphore(self.max_archives)
+
+    with ThreadPoolExecutor(max_workers=self.export_workers) as exports, \
+      ThreadPoolExecutor(max_workers=self.import_workers) as imports:
+
+      export_futures = {
+        exports.submit(self.__export, project, report, workdir, archives): report
+        for project, report in zip(self.projects, reports)
+      }
+
+      import_futures = []
+      for future in as_completed(export_futures):
+        report = export_futures[future]
+        try:
+          filepath = future.result()
+        except Exception as e:
+          self.__fail(report, 'export', e)
+          continue
+
+        import_futures.append(imports.submit(self.__import, filepath, report, archives))
+
+      for future in as_completed(import_futures):
+        future.result()
+
+    if (self.workdir is None):
+      shutil.rmtree(workdir, ignore_errors=True)
+
+    return reports
+
+
+  def __create_report(self, project):
+    name = project if isinstance(project, str) else project.name
+    return {
+      'project': name,
+      'target_project': self.name_format.format(name=name),
+      'target_owner': self.target_owner_name,
+      'status': 'pending',
+      'stage': None,
+      'error': None,
+      'export_seconds': None,
+      'import_seconds': None,
+      'unresolved_relations': None,
+      'rejected_annotations': None,
+      'rejected_relations': None,
+      'dead_letter_path': None,
+    }
+
+
+  def __export(self, project, report: dict, workdir: str, archives: threading.BoundedSemaphore):
+    archives.acquire()
+    started = time.monotonic()
+    report['status'] = 'exporting'
+
+    filepath = None
+    try:
+      if (isinstance(project, str)):
+        project = self.lab.find_project(project, self.owner_name)
+
+      filepath = os.path.join(workdir, f'{project.owner_name}-{project.id}.zip')
+      project.export(
+        filepath,
+        include_annotation_types=True,
+        include_sources=True,
+        include_text_bounds=True,
+        timeout=self.timeout
+      )
+    except:
+      if (filepath is not None and os.path.exists(filepath)):
+        os.remove(filepath)
+      archives.release()
+      raise
+
+    report['export_seconds'] = time.monotonic() - started
+    return filepath
+
+
+  def __import(self, filepath: str, report: dict, archives: threading.BoundedSemaphore):
+    started = time.monotonic()
+    report['status'] = 'importing'
+
+    project_import = None
+    try:
+      project = self.lab.create_project(report['target_project'], self.target_owner_name, is_public=self.is_public)
+      archive_name = os.path.splitext(os.path.basename(filepath))[0]
+      dead_letter_path = os.path.join(self.dead_letter_dir, f'{archive_name}.rejected.jsonl')
+      project_import = ProjectImport(filepath, project, self.target_owner_name, dead_letter_path=dead_letter_path)
+
+      project_import.unzip_export()
+      project_import.import_all(workers=self.upload_workers)
+
+      report['unresolved_relations'] = len(project_import.unresolved_relations)
+      report['status'] = 'finished'
+    except Exception as e:
+      self.__fail(report, 'import', e)
+    finally:
+      report['import_seconds'] = time.monotonic() - started
+      if (project_import is not None):
+        self.__add_rejects(report, project_import.reject_report)
+        project_import.cleanup()
+      if (os.path.exists(filepath)):
+        os.remove(filepath)
+      archives.release()
+
+
+  def __add_rejects(self, report: dict, reject_report: dict):
+    if (reject_report is None):
+      return
+
+    report['rejected_annotations'] = reject_report['annotations']
+    report['rejected_relations'] = reject_report['relations']
+    report['dead_letter_path'] = reject_report['dead_letter_path']
+
+
+  def __fail(self, report: dict, stage: str, error: Exception):
+    logger.error(f'Migration of project {report["project"]} failed during {stage}: {error}')
+    report['status'] = 'errored'
+    report['stage'] = stage
+    report['error'] = str(error)
@@ -0,0 +1,81 @@
+import threading
+from typing import Any, Dict, Hashable, Iterable, List
+
+
+class RelationScheduler:
+  """
+    Holds relations back until both of their annotations have been settled (created on the
+    server, or otherwise accounted for), so relations can be uploaded alongside the annotations
+    they depend on rather than after all of them.
+
+    Safe to use from multiple threads.
+  """
+
+  def __init__(self):
+    self.__lock = threading.Lock()
+    self.__settled = set()
+    # Maps an unsettled annotation id to the pending entries waiting on it.
+    # Each entry is a [relation, remaining unsettled endpoint count] pair.
+    self.__waiting: Dict[Hashable, List[list]] = {}
+    self.__pending_count = 0
+
+
+  @property
+  def pending_count(self):
+    return self.__pending_count
+
+
+  def add(self, relation: Any, endpoints: Iterable[Hashable]) -> List[Any]:
+    """
+      Schedules a relation. Returns [relation] if all of its endpoints are already settled,
+      otherwise an empty list and the relation is released by a later call to settle.
+    """
+    with self.__lock:
+      unsettled = set(endpoints) - self.__settled
+      if (len(unsettled) == 0):
+        return [relation]
+
+      entry = [relation, len(unsettled)]
+      for endpoint in unsettled:
+        self.__waiting.setdefault(endpoint, []).append(entry)
+      self.__pending_count += 1
+
+      return []
+
+
+  def settle(self, endpoints: Iterable[Hashable]) -> List[Any]:
+    """
+      Marks annotations as settled. Returns the relations that became ready as a result.
+    """
+    released = []
+    with self.__lock:
+      for endpoint in endpoints:
+        if (endpoint in self.__settled):
+          continue
+
+        self.__settled.add(endpoint)
+        for entry in self.__waiting.pop(endpoint, []):
+          entry[1] -= 1
+          if (entry[1] == 0):
+            released.append(entry[0])
+
+      self.__pending_count -= len(released)
+
+    return released
+
+
+  def finish(self) -> List[Any]:
+    """
+      Returns the relations that are still waiting on an endpoint which was never settled,
+      and clears them from the scheduler.
+    """
+    with self.__lock:
+      unresolved = {}
+      for entries in self.__waiting.values():
+        for entry in entries:
+          unresolved[id(entry)] = entry[0]
+
+      self.__waiting = {}
+      self.__pending_count = 0
+
+      return list(unresolved.values())
@@ -0,0 +1,324 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import threading
+import zipfile
+from typing import Any, List, Union
+
+import jsonlines
+
+
+class SourceCache:
+  """
+    On-disk, content-addressed cache of source text and text bounds.
+
+    Entries are keyed by source id and version. The version defaults to a hash of the source text, so the
+    same text fetched through find_source or read from an export lands in the same entry. The cache also
+    remembers which entry each source path and source id last resolved to.
+
+    Once the cache grows beyond max_bytes, the least recently read entries are evicted.
+    Text is read through a memory map.
+
+      cache = SourceCache('/path/to/cache')
+      project.find_source('contract.pdf', cache=cache)
+      cache.populate_from_export('/path/to/export.zip')
+      cache.get_source(source_id)
+  """
+
+  def __init__(self, directory: str, max_bytes: int = 10 * 1024 ** 3):
+    self.directory = directory
+    self.max_bytes = max_bytes
+    self.__lock = threading.Lock()
+    self.__size = None
+
+    os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+    os.makedirs(os.path.join(directory, 'refs'), exist_ok=True)
+
+
+  @staticmethod
+  def text_version(text: str):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+
+  def put(self, source_id: Union[int, str], text: str = None, text_bounds: Any = None, metadata: dict = None, version: str = None):
+    """
+      Stores a source's text, text bounds and metadata. Fields left as None keep any value already cached
+      for the same version. Returns the version stored.
+    """
+    if (version is None):
+      if (text is None):
+        version = self.__read_ref(f'source-{source_id}')
+        if (version is None):
+          raise Exception(f'Unable to cache source {source_id} without text or a version.')
+      else:
+        version = self.text_version(text)
+
+    prefix = self.__object_prefix(source_id, version)
+    os.makedirs(os.path.dirname(prefix), exist_ok=True)
+
+    if (text is not None):
+      self.__write(f'{prefix}.text', text.encode('utf-8'))
+    if (text_bounds is not None):
+      self.__write(f'{prefix}.bounds.json', json.dumps(text_bounds).encode('utf-8'))
+    if (metadata is not None):
+      self.__write(f'{prefix}.meta.json', json.dumps(metadata).encode('utf-8'))
+
+    self.__write_ref(f'source-{source_id}', version)
+    self.__evict_if_needed()
+
+    return version
+
+
+  def alias(self, path: str, source_id: Union[int, str]):
+    """Records that a source path (owner/project/directory/name) refers to source_id."""
+    self.__write_ref(self.__path_ref(path), str(source_id))
+
+
+  def resolve(self, path: str):
+    """Returns the source id last cached for a source path, or None."""
+    return self.__read_ref(self.__path_ref(path))
+
+
+  def open_text(self, source_id: Union[int, str], version: str = None):
+    """
+      Returns a read-only memory map of the utf-8 encoded source text, or None if it is not cached.
+      The caller is responsible for closing it.
+    """
+    filepath = self.__object_path(source_id, version, 'text')
+    if (filepath is None):
+      return None
+
+    with open(filepath, 'rb') as f:
+      if (os.fstat(f.fileno()).st_size == 0):
+        return b''
+      return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+  def get_text(self, source_id: Union[int, str], version: str = None):
+    text = self.open_text(source_id, version)
+    if (text is None or isinstance(text, bytes)):
+      return text.decode('utf-8') if text is not None else None
+
+    try:
+      return text[:].decode('utf-8')
+    finally:
+      text.close()
+
+
+  def get_text_bounds(self, source_id: Union[int, str], version: str = None):
+    filepath = self.__object_path(source_id, version, 'bounds.json')
+    if (filepath is None):
+      return None
+
+    with open(filepath, 'rb') as f:
+      return json.load(f)
+
+
+  def get_source(self, source_id: Union[int, str], version: str = None):
+    """
+      Returns the cached metadata of a source, with its text and text bounds, or None if it is not cached.
+      The metadata is that of the api response the source was cached from, or for a source only
+      cached from an export, the export's source record (sourceId, sourceName, directoryName, type).
+    """
+    source = self.__read_metadata(source_id, version, 'meta.json')
+    if (source is None):
+      source = self.__read_metadata(source_id, version, 'export.json')
+
+    return self.__with_text(source, source_id, version)
+
+
+  def get_source_response(self, source_id: Union[int, str], version: str = None):
+    """
+      Returns a source as cached by put_source_response, in the shape of the api response,
+      or None if it was not cached from a response.
+    """
+    return self.__with_text(self.__read_metadata(source_id, version, 'meta.json'), source_id, version)
+
+
+  def put_source_response(self, source: dict, path: str = None):
+    """
+      Caches a source as returned by Project.find_source, optionally recording the path it was found at.
+      A response without text or a version is versioned on its metadata. Returns the version stored,
+      or None if the response has no id to cache it under.
+    """
+    source_id = source.get('id', source.get('sourceId'))
+    if (source_id is None):
+      return None
+
+    metadata = { key: value for key, value in source.items() if key not in ('text', 'textBounds') }
+
+    version = source.get('version')
+    if (version is None and source.get('text') is None):
+      version = self.__read_ref(f'source-{source_id}')
+      if (version is None):
+        version = self.text_version(json.dumps(metadata, sort_keys=True, default=str))
+
+    version = self.put(
+      source_id,
+      text=source.get('text'),
+      text_bounds=source.get('textBounds'),
+      metadata=metadata,
+      version=version
+    )
+
+    if (path is not None):
+      self.alias(path, source_id)
+
+    return version
+
+
+  def populate_from_export(self, filepath: str):
+    """
+      Caches the source text and text bounds of an export, from its zip archive or unpacked directory.
+      Returns the ids of the sources cached.
+
+      Export records differ from api responses, so the cached sources are read through get_source(source_id).
+      They are not returned by Project.find_source, though it shares their text when it caches the same source.
+    """
+    source_ids = []
+
+    for name, reader in self.__export_files(filepath, r'.*\.sources\.jsonl'):
+      for source in reader:
+        if (source.get('text') is None):
+          continue
+        metadata = { key: value for key, value in source.items() if key != 'text' }
+        version = self.put(source['sourceId'], text=source['text'])
+        prefix = self.__object_prefix(source['sourceId'], version)
+        self.__write(f'{prefix}.export.json', json.dumps(metadata).encode('utf-8'))
+        source_ids.append(source['sourceId'])
+
+    for name, reader in self.__export_files(filepath, r'.*\.text-bounds\.jsonl'):
+      for bounds in reader:
+        if (self.__read_ref(f'source-{bounds["sourceId"]}') is not None):
+          self.put(bounds['sourceId'], text_bounds=bounds.get('textBounds'))
+
+    return source_ids
+
+
+  def __read_metadata(self, source_id: Union[int, str], version: str, extension: str):
+    filepath = self.__object_path(source_id, version, extension)
+    if (filepath is None):
+      return None
+
+    with open(filepath, 'rb') as f:
+      return json.load(f)
+
+
+  def __with_text(self, source: dict, source_id: Union[int, str], version: str):
+    if (source is None):
+      return None
+
+    text = self.get_text(source_id, version)
+    if (text is not None):
+      source['text'] = text
+    text_bounds = self.get_text_bounds(source_id, version)
+    if (text_bounds is not None):
+      source['textBounds'] = text_bounds
+
+    return source
+
+
+  def __export_files(self, filepath: str, pattern: str):
+    if (os.path.isdir(filepath)):
+      for name in sorted(os.listdir(filepath)):
+        if (re.match(pattern, name) is not None):
+          with jsonlines.open(os.path.join(filepath, name)) as reader:
+            yield name, reader
+      return
+
+    with zipfile.ZipFile(filepath) as archive:
+      for name in archive.namelist():
+        if (re.match(pattern, os.path.basename(name)) is not None):
+          with archive.open(name) as f, jsonlines.Reader(f) as reader:
+            yield name, reader
+
+
+  def __object_prefix(self, source_id: Union[int, str], version: str):
+    key = hashlib.sha256(f'{source_id}:{version}'.encode('utf-8')).hexdigest()
+    return os.path.join(self.directory, 'objects', key[:2], key)
+
+
+  def __object_path(self, source_id: Union[int, str], version: str, extension: str):
+    version = version or self.__read_ref(f'source-{source_id}')
+    if (version is None):
+      return None
+
+    filepath = f'{self.__object_prefix(source_id, version)}.{extension}'
+    if (not os.path.exists(filepath)):
+      return None
+
+    # Reads refresh the modification time, which orders entries for eviction.
+    os.utime(filepath)
+    return filepath
+
+
+  def __path_ref(self, path: str):
+    return 'path-' + hashlib.sha256(path.encode('utf-8')).hexdigest()
+
+
+  def __read_ref(self, name: str):
+    try:
+      with open(os.path.join(self.directory, 'refs', name), 'r') as f:
+        return f.read()
+    except FileNotFoundError:
+      return None
+
+
+  def __write_ref(self, name: str, value: str):
+    with self.__lock:
+      self.__write_file(os.path.join(self.directory, 'refs', name), value.encode('utf-8'))
+
+
+  def __write(self, filepath: str, data: bytes):
+    with self.__lock:
+      previous = os.path.getsize(filepath) if os.path.exists(filepath) else 0
+      self.__write_file(filepath, data)
+      if (self.__size is not None):
+        self.__size += len(data) - previous
+
+
+  def __write_file(self, filepath: str, data: bytes):
+    tmp_filepath = f'{filepath}.{threading.get_ident()}.tmp'
+    with open(tmp_filepath, 'wb') as f:
+      f.write(data)
+    os.replace(tmp_filepath, filepath)
+
+
+  def __object_files(self) -> List[os.DirEntry]:
+    entries = []
+    objects_dir = os.path.join(self.directory, 'objects')
+    for shard in os.scandir(objects_dir):
+      if (shard.is_dir()):
+        entries.extend(entry for entry in os.scandir(shard.path) if entry.is_file())
+    return entries
+
+
+  def __evict_if_needed(self):
+    with self.__lock:
+      if (self.__size is None):
+        self.__size = sum(entry.stat().st_size for entry in self.__object_files())
+
+      if (self.__size <= self.max_bytes):
+        return
+
+      # Evict whole entries (text, bounds and metadata together), least recently read first.
+      entries = {}
+      for file in self.__object_files():
+        key = file.name.split('.')[0]
+        stat = file.stat()
+        entry = entries.setdefault(key, { 'paths': [], 'size': 0, 'mtime': 0 })
+        entry['paths'].append(file.path)
+        entry['size'] += stat.st_size
+        entry['mtime'] = max(entry['mtime'], stat.st_mtime)
+
+      for entry in sorted(entries.values(), key=lambda entry: entry['mtime']):
+        if (self.__size <= self.max_bytes):
+          break
+        for path in entry['paths']:
+          try:
+            os.remove(path)
+          except FileNotFoundError:
+            pass
+        self.__size -= entry['size']
@@ -0,0 +1,46 @@
+import os
+from typing import Dict, Union
+
+import jsonlines
+
+
+class SyncManifest:
+  """
+    Record of the annotations and relations sent to a project by a previous sync, keyed on
+    content fingerprint (see annolab.util.fingerprint).
+
+    Each fingerprint maps to the id the server assigned it, or None when the manifest was
+    built from a baseline export and the id in the target project is unknown.
+  """
+
+  def __init__(self, filepath: str = None):
+    self.filepath = filepath
+    self.annotations: Dict[bytes, Union[int, None]] = {}
+    self.relations: Dict[bytes, Union[int, None]] = {}
+
+    if (filepath is not None and os.path.exists(filepath)):
+      self.load()
+
+
+  def load(self):
+    with jsonlines.open(self.filepath) as entries:
+      for entry in entries:
+        fingerprint = bytes.fromhex(entry['fingerprint'])
+        if (entry['kind'] == 'relation'):
+          self.relations[fingerprint] = entry.get('id')
+        else:
+          self.annotations[fingerprint] = entry.get('id')
+
+
+  def save(self):
+    if (self.filepath is None):
+      raise Exception('Unable to save sync manifest. No filepath was provided.')
+
+    tmp_filepath = f'{self.filepath}.tmp'
+    with jsonlines.open(tmp_filepath, mode='w') as writer:
+      for fingerprint, id in self.annotations.items():
+        writer.write({ 'kind': 'annotation', 'fingerprint': fingerprint.hex(), 'id': id })
+      for fingerprint, id in self.relations.items():
+        writer.write({ 'kind': 'relation', 'fingerprint': fingerprint.hex(), 'id': id })
+
+    os.replace(tmp_filepath, self.filepath)
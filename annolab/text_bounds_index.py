@@ -0,0 +1,181 @@
+from typing import Dict, Iterable, Iterator, List
+
+import jsonlines
+
+from annolab.geometry import Geometry, np
+
+
+class TextBoundsIndex:
+  """
+    Projects character offsets onto a pdf source's pages and token bounds, for many spans at once.
+    Requires numpy: pip install annolab[geometry]
+
+    Built from a source's text bounds, a list of tokens (as returned in find_source's textBounds or an
+    export's text-bounds.jsonl) each with:
+      offsets:               [int, int]  (or start / end)
+      pageNumber or page:    int
+      bbox:                  [x0, y0, x1, y1]  (or a bounds / textBounds polygon)
+
+    Spans are projected onto the page of their first token. Tokens on later pages only set endPage.
+
+      index = project.text_bounds_index('contract.pdf')
+      project.create_annotations('contract.pdf', index.annotate(annotations))
+  """
+
+  def __init__(self, starts, ends, pages, boxes):
+    if (np is None):
+      raise Exception('TextBoundsIndex requires numpy. Install it with: pip install annolab[geometry]')
+
+    order = np.argsort(starts, kind='stable')
+    self.starts = np.asarray(starts, dtype=np.int64)[order]
+    self.ends = np.asarray(ends, dtype=np.int64)[order]
+    self.pages = np.asarray(pages, dtype=np.int64)[order]
+    self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)[order]
+    # Index of the last token on the same page as each token, assuming pages follow reading order.
+    self.page_last = np.searchsorted(self.pages, self.pages, side='right') - 1
+
+
+  @staticmethod
+  def from_text_bounds(text_bounds: List[Dict]) -> 'TextBoundsIndex':
+    starts, ends, pages, boxes = [], [], [], []
+
+    for token in text_bounds:
+      offsets = token.get('offsets') or [token.get('start'), token.get('end')]
+      bbox = token.get('bbox')
+      if (bbox is None):
+        bounds = token.get('bounds') or token.get('textBounds')
+        if (bounds is None):
+          continue
+        bbox = Geometry.from_geojson(bounds).bbox
+
+      starts.append(offsets[0])
+      ends.append(offsets[1])
+      pages.append(token.get('pageNumber', token.get('page')))
+      boxes.append(bbox)
+
+    return TextBoundsIndex(starts, ends, pages, boxes)
+
+
+  @staticmethod
+  def from_source(source: Dict) -> 'TextBoundsIndex':
+    """Builds an index from a source as returned by Project.find_source."""
+    return TextBoundsIndex.from_text_bounds(source.get('textBounds') or [])
+
+
+  @staticmethod
+  def from_export(text_bounds_filepath: str, source_id: int) -> 'TextBoundsIndex':
+    """Builds an index for one source from an unpacked export's text-bounds.jsonl file."""
+    with jsonlines.open(text_bounds_filepath) as text_bounds:
+      for bounds in text_bounds:
+        if (bounds['sourceId'] == source_id):
+          return TextBoundsIndex.from_text_bounds(bounds['textBounds'])
+
+    raise Exception(f'Text bounds for source {source_id} not found in {text_bounds_filepath}')
+
+
+  def project(self, offsets) -> Dict:
+    """
+      Projects a (k, 2) array of [start, end) character offsets. Returns a dict of arrays:
+        valid:        (k,) bool, False for spans that overlap no token
+        page:         (k,) page of the span's first token
+        end_page:     (k,) page of the span's last token
+        bbox:         (k, 4) [x0, y0, x1, y1] bounds of the span on its first page
+        line_boxes:   (l, 4) bounds of each line of each span, lines split where tokens stop overlapping vertically
+        line_offsets: (k + 1,) span i's lines are line_boxes[line_offsets[i]:line_offsets[i + 1]]
+    """
+    offsets = np.asarray(offsets, dtype=np.int64).reshape(-1, 2)
+    first = np.searchsorted(self.ends, offsets[:, 0], side='right')
+    last = np.searchsorted(self.starts, offsets[:, 1], side='left') - 1
+    valid = (first <= last) & (first < len(self.starts))
+
+    safe_first = np.where(valid, first, 0)
+    safe_last = np.where(valid, last, 0)
+    last_on_page = np.minimum(safe_last, self.page_last[safe_first]) if len(self.starts) > 0 else safe_last
+    counts = np.where(valid, last_on_page - safe_first + 1, 0)
+
+    page = np.where(valid, self.pages[safe_first], -1) if len(self.starts) > 0 else np.full(len(offsets), -1)
+    end_page = np.where(valid, self.pages[safe_last], -1) if len(self.starts) > 0 else page
+
+    # Expand each span into the indexes of the tokens it covers on its first page.
+    span_starts = np.zeros(len(offsets) + 1, dtype=np.int64)
+    np.cumsum(counts, out=span_starts[1:])
+    span_ids = np.repeat(np.arange(len(offsets)), counts)
+    tokens = safe_first[span_ids] + (np.arange(span_starts[-1]) - span_starts[:-1][span_ids])
+    boxes = self.boxes[tokens]
+
+    # A new line starts at each span's first token, and where a token does not vertically overlap the previous one.
+    line_start = np.ones(len(tokens), dtype=bool)
+    if (len(tokens) > 1):
+      line_start[1:] = (boxes[1:, 1] >= boxes[:-1, 3]) | (boxes[1:, 3] <= boxes[:-1, 1])
+    line_start[span_starts[:-1][counts > 0]] = True
+
+    line_indexes = np.flatnonzero(line_start)
+    line_boxes = np.zeros((len(line_indexes), 4))
+    bbox = np.full((len(offsets), 4), np.nan)
+    if (len(tokens) > 0):
+      line_boxes = np.concatenate([
+        np.minimum.reduceat(boxes[:, :2], line_indexes, axis=0),
+        np.maximum.reduceat(boxes[:, 2:], line_indexes, axis=0),
+      ], axis=1)
+
+      nonempty = np.flatnonzero(counts > 0)
+      bbox[nonempty] = np.concatenate([
+        np.minimum.reduceat(boxes[:, :2], span_starts[nonempty], axis=0),
+        np.maximum.reduceat(boxes[:, 2:], span_starts[nonempty], axis=0),
+      ], axis=1)
+
+    line_offsets = np.zeros(len(offsets) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(span_ids[line_indexes], minlength=len(offsets)), out=line_offsets[1:])
+
+    return {
+      'valid': valid,
+      'page': page,
+      'end_page': end_page,
+      'bbox': bbox,
+      'line_boxes': line_boxes,
+      'line_offsets': line_offsets,
+    }
+
+
+  def annotate(self, annotations: Iterable[Dict], batch_size: int = 10000) -> Iterator[Dict]:
+    """
+      Fills in page, text_bounds and bbox of sdk annotation dicts from their offsets, projecting them
+      in batches. Annotations that already have text_bounds, have no offsets, or overlap no token are
+      passed through unchanged. Returns a generator, suitable for create_annotations or
+      create_bulk_annotations.
+    """
+    batch = []
+    for annotation in annotations:
+      batch.append(annotation)
+      if (len(batch) >= batch_size):
+        yield from self.__annotate_batch(batch)
+        batch = []
+
+    if (len(batch) > 0):
+      yield from self.__annotate_batch(batch)
+
+
+  def __annotate_batch(self, batch: List[Dict]):
+    indexes = [i for i, atn in enumerate(batch) if atn.get('offsets') is not None and 'text_bounds' not in atn]
+    if (len(indexes) == 0):
+      return batch
+
+    projection = self.project([batch[i]['offsets'] for i in indexes])
+    line_offsets = projection['line_offsets'].tolist()
+    pages = projection['page'].tolist()
+    end_pages = projection['end_page'].tolist()
+
+    for position, index in enumerate(indexes):
+      if (not projection['valid'][position]):
+        continue
+
+      annotation = dict(batch[index])
+      lines = projection['line_boxes'][line_offsets[position]:line_offsets[position + 1]]
+      annotation['text_bounds'] = Geometry.from_boxes(lines)
+      annotation['bbox'] = projection['bbox'][position].tolist()
+      annotation.setdefault('page', pages[position])
+      if (end_pages[position] != pages[position]):
+        annotation.setdefault('endPage', end_pages[position])
+      batch[index] = annotation
+
+    return batch
@@ -0,0 +1,120 @@
+from abc import ABC, abstractmethod
+from typing import Any, Iterator
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class Transport(ABC):
+  """
+    Sends the http requests made by ApiHelper.
+
+    Responses must provide status_code, headers, content and json(), as requests and httpx responses do.
+    Subclasses implement request and iter_bytes.
+  """
+
+  @abstractmethod
+  def request(
+    self,
+    method: str,
+    url: str,
+    headers: dict = None,
+    data: Any = None,
+    params: dict = None,
+    timeout: float = None,
+    stream: bool = False
+  ):
+    """
+      Sends a request. data may be bytes, a filelike object or an iterator of bytes, the latter sent with
+      chunked transfer encoding. With stream=True, the response body is not read until iter_bytes is called.
+    """
+
+
+  @abstractmethod
+  def iter_bytes(self, response, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Iterates over the body of a response requested with stream=True."""
+
+
+  def close_response(self, response):
+    """Releases the connection of a response requested with stream=True."""
+    response.close()
+
+
+  def close(self):
+    pass
+
+
+class RequestsTransport(Transport):
+  """
+    Default HTTP/1.1 transport, backed by a pooled requests.Session.
+    pool_size is the number of connections kept open per host, roughly the number of concurrent requests.
+  """
+
+  def __init__(self, pool_size: int = 32):
+    self.session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    self.session.mount('https://', adapter)
+    self.session.mount('http://', adapter)
+
+
+  def request(self, method, url, headers=None, data=None, params=None, timeout=None, stream=False):
+    return self.session.request(
+      method,
+      url,
+      headers=headers,
+      data=data,
+      params=params,
+      timeout=timeout,
+      stream=stream
+    )
+
+
+  def iter_bytes(self, response, chunk_size=64 * 1024):
+    return response.iter_content(chunk_size=chunk_size)
+
+
+  def close(self):
+    self.session.close()
+
+
+class Http2Transport(Transport):
+  """
+    HTTP/2 transport backed by httpx, which multiplexes concurrent requests over a few connections.
+    Requires the optional http2 dependencies: pip install annolab[http2]
+
+    max_connections bounds the number of connections opened per host. Concurrent requests beyond that
+    share connections as separate streams.
+  """
+
+  def __init__(self, max_connections: int = 4, max_keepalive_connections: int = 4):
+    try:
+      import httpx
+    except ImportError:
+      raise Exception('Http2Transport requires httpx with http2 support. Install it with: pip install annolab[http2]')
+
+    self.client = httpx.Client(
+      http2=True,
+      limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections),
+      timeout=None
+    )
+
+
+  def request(self, method, url, headers=None, data=None, params=None, timeout=None, stream=False):
+    request = self.client.build_request(
+      method,
+      url,
+      headers=headers,
+      content=data,
+      params=params,
+      timeout=timeout
+    )
+
+    return self.client.send(request, stream=stream)
+
+
+  def iter_bytes(self, response, chunk_size=64 * 1024):
+    return response.iter_bytes(chunk_size=chunk_size)
+
+
+  def close(self):
+    self.client.close()
@@ -0,0 +1,46 @@
+import os
+import threading
+from typing import Union
+
+import jsonlines
+
+
+class UploadManifest:
+  """
+    Local, append-only record of the pdf files uploaded to each project, keyed by directory, name and
+    content hash. Used by Project.create_pdf_source(skip_duplicates=True) to skip re-uploading a file
+    to the same source. Identical content uploaded under another name or directory is not a match.
+  """
+
+  def __init__(self, filepath: str):
+    self.filepath = filepath
+    self.__entries = {}
+    self.__lock = threading.Lock()
+
+    if (os.path.exists(filepath)):
+      with jsonlines.open(filepath) as entries:
+        for entry in entries:
+          self.__entries[self.__key(entry['project'], entry['hash'], entry['directory'], entry['name'])] = entry
+
+
+  def find(self, project: Union[str, int], content_hash: str, directory: str, name: str):
+    return self.__entries.get(self.__key(project, content_hash, directory, name))
+
+
+  def add(self, project: Union[str, int], content_hash: str, directory: str, name: str, source: dict):
+    entry = {
+      'project': project,
+      'hash': content_hash,
+      'directory': directory,
+      'name': name,
+      'source': source,
+    }
+
+    with self.__lock:
+      self.__entries[self.__key(project, content_hash, directory, name)] = entry
+      with jsonlines.open(self.filepath, mode='a') as writer:
+        writer.write(entry)
+
+
+  def __key(self, project: Union[str, int], content_hash: str, directory: str, name: str):
+    return (str(project), directory, name, content_hash)
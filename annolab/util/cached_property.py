@@ -1,7 +1,12 @@
 import functools
+import threading
 
 # https://stackoverflow.com/questions/20535342/lazy-evaluation-in-python
 class cached_property(object):
+  """
+    Computes a property once per instance. Concurrent first accesses from several threads wait for a
+    single computation rather than each running the function.
+  """
   def __init__(self, function):
     self.function = function
     functools.update_wrapper(self, function)
@@ -9,6 +14,13 @@ class cached_property(object):
   def __get__(self, obj, type_):
     if obj is None:
       return self
-    val = self.function(obj)
-    obj.__dict__[self.function.__name__] = val
-    return val
\ No newline at end of file
+
+    name = self.function.__name__
+    # dict.setdefault is atomic, so every thread gets the same lock for this instance and property.
+    lock = obj.__dict__.setdefault(f'__{name}_lock', threading.Lock())
+    with lock:
+      if name in obj.__dict__:
+        return obj.__dict__[name]
+      val = self.function(obj)
+      obj.__dict__[name] = val
+      return val
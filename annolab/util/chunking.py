@@ -0,0 +1,75 @@
+from typing import Dict, List, Tuple
+
+
+def partition_annotations(
+  api_annotations: List[Dict],
+  api_relations: List[Dict],
+  chunk_size: int
+) -> Tuple[List[Tuple[List[Dict], List[Dict]]], List[Dict]]:
+  """
+    Splits api annotations and relations into chunks of at most chunk_size annotations, keeping
+    annotations connected by relations in the same chunk where possible.
+
+    Returns a list of (annotations, relations) chunks, and the relations whose annotations ended up
+    in different chunks. Those must be created once the annotations of every chunk have ids.
+  """
+  parents = {}
+
+  def find(client_id):
+    root = client_id
+    while (parents[root] != root):
+      root = parents[root]
+    while (parents[client_id] != root):
+      parents[client_id], client_id = root, parents[client_id]
+    return root
+
+  for atn in api_annotations:
+    if ('clientId' in atn):
+      parents.setdefault(atn['clientId'], atn['clientId'])
+
+  for rln in api_relations:
+    predecessor = rln['predecessorId']
+    successor = rln['successorId']
+    if (predecessor in parents and successor in parents):
+      parents[find(predecessor)] = find(successor)
+
+  # Group annotations into connected components, in order of first appearance.
+  components = {}
+  for index, atn in enumerate(api_annotations):
+    key = find(atn['clientId']) if 'clientId' in atn else ('unrelated', index)
+    components.setdefault(key, []).append(atn)
+
+  # Pack the largest components first. Components larger than a chunk are split across chunks.
+  chunks = []
+  current = []
+  for component in sorted(components.values(), key=len, reverse=True):
+    for start in range(0, len(component), chunk_size):
+      piece = component[start:start + chunk_size]
+      if (len(current) + len(piece) > chunk_size):
+        chunks.append(current)
+        current = []
+      current.extend(piece)
+
+  if (len(current) > 0 or len(chunks) == 0):
+    chunks.append(current)
+
+  chunk_of = {}
+  for index, chunk in enumerate(chunks):
+    for atn in chunk:
+      if ('clientId' in atn):
+        chunk_of[atn['clientId']] = index
+
+  chunk_relations = [[] for _ in chunks]
+  deferred = []
+  for rln in api_relations:
+    predecessor_chunk = chunk_of.get(rln['predecessorId'])
+    successor_chunk = chunk_of.get(rln['successorId'])
+
+    if (predecessor_chunk is not None and successor_chunk is not None and predecessor_chunk != successor_chunk):
+      deferred.append(rln)
+    else:
+      # Relations to annotations outside of this call are left for the api to resolve.
+      index = predecessor_chunk if predecessor_chunk is not None else successor_chunk
+      chunk_relations[index if index is not None else 0].append(rln)
+
+  return list(zip(chunks, chunk_relations)), deferred
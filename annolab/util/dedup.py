@@ -0,0 +1,143 @@
+from collections import deque
+import math
+import threading
+from typing import Iterable
+
+
+class Deduplicator:
+  """
+    Bounded-memory set of annotation fingerprints (see annolab.util.fingerprint), used to drop
+    duplicate annotations on the client before they are sent to the api.
+
+    In exact mode, up to `capacity` fingerprints are remembered and the oldest are forgotten first.
+    In bloom mode, two generations of bloom filters sized for `capacity` fingerprints are kept,
+    using a fraction of the memory at the cost of dropping roughly `error_rate` of unique
+    annotations as false positives.
+
+    A deduplicator is safe to share between threads. The number of annotations it has dropped is
+    available as `dropped`.
+  """
+
+  def __init__(self, capacity: int = 1000000, bloom: bool = False, error_rate: float = 0.001):
+    self.capacity = capacity
+    self.bloom = bloom
+    self.error_rate = error_rate
+    self.dropped = 0
+    self.__lock = threading.Lock()
+
+    if (bloom):
+      self.__bits = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+      self.__hashes = max(1, int(round(self.__bits / capacity * math.log(2))))
+      self.__current = bytearray((self.__bits + 7) // 8)
+      self.__previous = bytearray((self.__bits + 7) // 8)
+      self.__current_count = 0
+    else:
+      self.__keys = set()
+      self.__order = deque()
+
+
+  def __contains__(self, fingerprint: bytes):
+    with self.__lock:
+      if (self.bloom):
+        positions = self.__positions(fingerprint)
+        return self.__in_filter(self.__current, positions) or self.__in_filter(self.__previous, positions)
+
+      return self.__key(fingerprint) in self.__keys
+
+
+  def add(self, fingerprint: bytes):
+    with self.__lock:
+      if (self.bloom):
+        self.__add_to_filter(fingerprint)
+      else:
+        self.__add_key(self.__key(fingerprint))
+
+
+  def add_if_new(self, fingerprint: bytes) -> bool:
+    """
+      Adds a fingerprint, returning False (and counting a drop) if it was already present.
+    """
+    with self.__lock:
+      if (self.bloom):
+        positions = self.__positions(fingerprint)
+        if (self.__in_filter(self.__current, positions) or self.__in_filter(self.__previous, positions)):
+          self.dropped += 1
+          return False
+        self.__add_to_filter(fingerprint)
+        return True
+
+      key = self.__key(fingerprint)
+      if (key in self.__keys):
+        self.dropped += 1
+        return False
+      self.__add_key(key)
+      return True
+
+
+  def commit(self, fingerprints: Iterable[bytes], dropped: int = 0):
+    """
+      Adds the fingerprints of annotations the api has accepted, and counts the duplicates dropped
+      from the same request. Callers stage fingerprints until their request succeeds, so that
+      annotations of a failed request are not dropped when it is retried.
+    """
+    with self.__lock:
+      self.dropped += dropped
+      for fingerprint in fingerprints:
+        if (self.bloom):
+          self.__add_to_filter(fingerprint)
+        else:
+          self.__add_key(self.__key(fingerprint))
+
+
+  def record_dropped(self, count: int = 1):
+    with self.__lock:
+      self.dropped += count
+
+
+  def clear(self):
+    with self.__lock:
+      self.dropped = 0
+      if (self.bloom):
+        self.__current = bytearray(len(self.__current))
+        self.__previous = bytearray(len(self.__previous))
+        self.__current_count = 0
+      else:
+        self.__keys.clear()
+        self.__order.clear()
+
+
+  def __key(self, fingerprint: bytes):
+    # 64 bits of the fingerprint are plenty to tell annotations apart and store far more compactly.
+    return int.from_bytes(fingerprint[:8], 'little')
+
+
+  def __add_key(self, key: int):
+    if (key in self.__keys):
+      return
+
+    self.__keys.add(key)
+    self.__order.append(key)
+    if (len(self.__order) > self.capacity):
+      self.__keys.discard(self.__order.popleft())
+
+
+  def __positions(self, fingerprint: bytes):
+    # Double hashing over the two halves of the fingerprint.
+    h1 = int.from_bytes(fingerprint[:8], 'little')
+    h2 = int.from_bytes(fingerprint[8:16], 'little') | 1
+    return [(h1 + i * h2) % self.__bits for i in range(self.__hashes)]
+
+
+  def __in_filter(self, bits: bytearray, positions: list):
+    return all(bits[p >> 3] & (1 << (p & 7)) for p in positions)
+
+
+  def __add_to_filter(self, fingerprint: bytes):
+    if (self.__current_count >= self.capacity):
+      self.__previous = self.__current
+      self.__current = bytearray(len(self.__previous))
+      self.__current_count = 0
+
+    for p in self.__positions(fingerprint):
+      self.__current[p >> 3] |= 1 << (p & 7)
+    self.__current_count += 1
@@ -0,0 +1,32 @@
+import hashlib
+import io
+import mmap
+import os
+from typing import Union
+
+# Size of the blocks read from filelike objects while hashing.
+read_size = 1024 * 1024
+
+
+def hash_file(file: Union[str, io.IOBase, bytes]) -> str:
+  """
+    Streaming sha256 of a file path, filelike object or bytes.
+    Paths are hashed through a memory map. Filelike objects are read in blocks and rewound to
+    where they started, so they can be uploaded afterwards.
+  """
+  digest = hashlib.sha256()
+
+  if (isinstance(file, (bytes, bytearray))):
+    digest.update(file)
+  elif (isinstance(file, io.IOBase)):
+    start = file.tell()
+    for block in iter(lambda: file.read(read_size), b''):
+      digest.update(block)
+    file.seek(start)
+  else:
+    with open(file, 'rb') as f:
+      if (os.fstat(f.fileno()).st_size > 0):
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+          digest.update(mapped)
+
+  return digest.hexdigest()
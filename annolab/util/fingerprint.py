@@ -0,0 +1,49 @@
+import hashlib
+import json
+from typing import Dict
+
+# Api annotation fields that make up the content of an annotation.
+# Client ids and project identifiers are deliberately excluded, so the same annotation
+# fingerprints identically regardless of which project or import run it came from.
+annotation_identity_fields = (
+  'annoTypeIdentifier',
+  'sourceIdentifier',
+  'directoryIdentifier',
+  'offsets',
+  'pageNumber',
+  'endPageNumber',
+  'layerIdentifier',
+  'value',
+  'textBounds',
+  'imageBounds',
+  'bbox',
+)
+
+relation_identity_fields = (
+  'annoTypeIdentifier',
+  'value',
+)
+
+fingerprint_size = 16
+
+
+def _digest(values: list) -> bytes:
+  encoded = json.dumps(values, separators=(',', ':'), sort_keys=True, default=str)
+  return hashlib.blake2b(encoded.encode('utf-8'), digest_size=fingerprint_size).digest()
+
+
+def annotation_fingerprint(api_annotation: Dict) -> bytes:
+  """
+    Content hash of an api annotation dict (see Annotation.create_api_annotation).
+  """
+  return _digest([api_annotation.get(field) for field in annotation_identity_fields])
+
+
+def relation_fingerprint(api_relation: Dict, predecessor: bytes, successor: bytes) -> bytes:
+  """
+    Content hash of an api relation dict, keyed on the fingerprints of its two annotations
+    rather than their ids, which differ between projects.
+  """
+  values = [api_relation.get(field) for field in relation_identity_fields]
+  values.extend([predecessor.hex(), successor.hex()])
+  return _digest(values)
@@ -0,0 +1,97 @@
+import codecs
+import json
+from typing import Iterable, Iterator, List
+
+_decoder = json.JSONDecoder()
+_whitespace = ' \t\n\r'
+
+
+def iter_array_items(chunks: Iterable[bytes], fields: List[str] = None) -> Iterator:
+  """
+    Incrementally decodes a json array from a stream of byte chunks, yielding one item at a time
+    so the whole response never has to be held in memory. If fields is passed, dict items are
+    reduced to those keys as they are decoded.
+
+    A body that is not an array is decoded whole and yielded as a single item. An empty body,
+    e.g. that of a 204 response, raises a ValueError rather than being read as no items.
+  """
+  chunks = iter(chunks)
+  decoder = _IncrementalDecoder()
+  buffer = ''
+  position = 0
+  exhausted = False
+
+  def read_more():
+    nonlocal buffer, position, exhausted
+    chunk = next(chunks, None)
+    if (chunk is None):
+      exhausted = True
+      buffer = buffer[position:] + decoder.flush()
+    else:
+      buffer = buffer[position:] + decoder.decode(chunk)
+    position = 0
+
+  def skip(characters: str):
+    nonlocal position
+    while (True):
+      while (position < len(buffer) and buffer[position] in characters):
+        position += 1
+      if (position < len(buffer) or exhausted):
+        return
+      read_more()
+
+  skip(_whitespace)
+  if (position >= len(buffer)):
+    raise ValueError('Expected a json body, the response body is empty')
+
+  if (buffer[position] != '['):
+    while (not exhausted):
+      read_more()
+    yield _project(json.loads(buffer[position:]), fields)
+    return
+
+  position += 1
+  while (True):
+    skip(_whitespace + ',')
+    if (position >= len(buffer)):
+      raise ValueError('Unexpected end of json array')
+    if (buffer[position] == ']'):
+      return
+
+    # Retry decoding only once the buffer has doubled, so large items are not rescanned for every chunk.
+    required = 0
+    while (True):
+      if (len(buffer) - position >= required or exhausted):
+        try:
+          item, end = _decoder.raw_decode(buffer, position)
+          # A number at the very end of the buffer may continue in the next chunk.
+          if (end < len(buffer) or exhausted):
+            break
+          required = len(buffer) - position + 1
+        except json.JSONDecodeError:
+          if (exhausted):
+            raise
+          required = 2 * (len(buffer) - position)
+      read_more()
+
+    position = end
+    yield _project(item, fields)
+
+
+def _project(item, fields: List[str]):
+  if (fields is None or not isinstance(item, dict)):
+    return item
+  return { field: item.get(field) for field in fields }
+
+
+class _IncrementalDecoder:
+  """Decodes utf-8 chunks, holding back multi-byte characters split across chunk boundaries."""
+
+  def __init__(self):
+    self.__decoder = codecs.getincrementaldecoder('utf-8')()
+
+  def decode(self, chunk: bytes):
+    return self.__decoder.decode(chunk)
+
+  def flush(self):
+    return self.__decoder.decode(b'', final=True)
@@ -0,0 +1,57 @@
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator
+
+
+def encode_json_default(value: Any):
+  """
+    json.dumps default for values the sdk accepts in request bodies beyond plain json types:
+    Geometry and other objects with to_geojson, and numpy arrays and scalars.
+  """
+  if (hasattr(value, 'to_geojson')):
+    return value.to_geojson()
+  if (hasattr(value, 'tolist')):
+    return value.tolist()
+
+  raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+# Encoded records are buffered into chunks of about this many bytes before being sent.
+default_chunk_size = 64 * 1024
+
+
+def iter_json_body(
+  fields: Dict[str, Any],
+  array_key: str,
+  records: Iterable,
+  encode: Callable = None,
+  chunk_size: int = default_chunk_size
+) -> Iterator[bytes]:
+  """
+    Lazily serializes a json object body made of `fields` plus an array of `records` under array_key,
+    encoding each record with `encode` as it is consumed. Yields utf-8 chunks of about chunk_size bytes,
+    so arbitrarily large bodies can be sent with constant memory.
+  """
+  head = json.dumps(fields, separators=(',', ':'))[:-1]
+  separator = ',' if len(fields) > 0 else ''
+  buffer = [f'{head}{separator}{json.dumps(array_key)}:[']
+  buffered = len(buffer[0])
+  first = True
+
+  for record in records:
+    if (encode is not None):
+      record = encode(record)
+
+    encoded = json.dumps(record, separators=(',', ':'), default=encode_json_default)
+    if (not first):
+      encoded = ',' + encoded
+    first = False
+
+    buffer.append(encoded)
+    buffered += len(encoded)
+    if (buffered >= chunk_size):
+      yield ''.join(buffer).encode('utf-8')
+      buffer = []
+      buffered = 0
+
+  buffer.append(']}')
+  yield ''.join(buffer).encode('utf-8')
@@ -0,0 +1,147 @@
+from collections import deque
+import json
+import multiprocessing
+import os
+import queue
+from typing import Callable, Iterator, List, Tuple
+
+# Files smaller than this are parsed in the calling process.
+default_shard_size = 32 * 1024 * 1024
+# Worker processes are spawned rather than forked: readers run alongside upload threads, and forking
+# a process with running threads can deadlock the child.
+start_method = 'spawn'
+
+
+def split_ranges(filepath: str, shard_size: int = default_shard_size) -> List[Tuple[int, int]]:
+  """
+    Splits a jsonl file into (start, end) byte ranges of roughly shard_size bytes,
+    each starting at the beginning of a line and ending after a newline (or at end of file).
+  """
+  file_size = os.path.getsize(filepath)
+  ranges = []
+
+  with open(filepath, 'rb') as f:
+    start = 0
+    while (start < file_size):
+      end = start + shard_size
+      if (end >= file_size):
+        end = file_size
+      else:
+        f.seek(end)
+        f.readline()
+        end = f.tell()
+
+      ranges.append((start, end))
+      start = end
+
+  return ranges
+
+
+def parse_range(filepath: str, start: int, end: int, batch_size: int, transform: Callable = None) -> List[List]:
+  """
+    Decodes the lines of a byte range of a jsonl file into batches of records.
+    Records for which transform returns None are dropped.
+  """
+  with open(filepath, 'rb') as f:
+    f.seek(start)
+    data = f.read(end - start)
+
+  batches = []
+  batch = []
+  for line in data.splitlines():
+    if (len(line.strip()) == 0):
+      continue
+
+    record = json.loads(line)
+    if (transform is not None):
+      record = transform(record)
+      if (record is None):
+        continue
+
+    batch.append(record)
+    if (len(batch) >= batch_size):
+      batches.append(batch)
+      batch = []
+
+  if (len(batch) > 0):
+    batches.append(batch)
+
+  return batches
+
+
+def _parse_shard(args: tuple):
+  return parse_range(*args)
+
+
+def read_batches(
+  filepath: str,
+  batch_size: int = 500,
+  workers: int = 1,
+  ordered: bool = True,
+  transform: Callable = None,
+  shard_size: int = default_shard_size
+) -> Iterator[List]:
+  """
+    Yields batches of decoded records from a jsonl file. The file is parsed in the calling process unless
+    workers is more than 1 (or None, for the number of cpus), in which case shards of the file are parsed
+    in a pool of that many processes. At most workers * 2 shards are held at once.
+
+    Worker processes are spawned and re-import the caller's __main__ module, so only pass workers
+    from scripts whose entry point is guarded with if __name__ == '__main__'. transform is applied
+    to each decoded record in the worker process, so it must be picklable, e.g. a module level
+    function or a functools.partial of one.
+    With ordered=False, batches are yielded as soon as their shard is parsed.
+    A batch never spans two shards, so batches at shard boundaries may be smaller than batch_size.
+  """
+  ranges = split_ranges(filepath, shard_size)
+  workers = workers or os.cpu_count() or 1
+
+  if (workers == 1 or len(ranges) <= 1):
+    for start, end in ranges:
+      for batch in parse_range(filepath, start, end, batch_size, transform):
+        yield batch
+    return
+
+  tasks = iter([(filepath, start, end, batch_size, transform) for start, end in ranges])
+  # Only this many shards are parsed or waiting to be consumed at once, bounding memory when the
+  # consumer is slower than the parsers.
+  window = workers * 2
+
+  with multiprocessing.get_context(start_method).Pool(min(workers, len(ranges))) as pool:
+    if (ordered):
+      results = deque(pool.apply_async(_parse_shard, (task,)) for task in _take(tasks, window))
+      while (len(results) > 0):
+        batches = results.popleft().get()
+        results.extend(pool.apply_async(_parse_shard, (task,)) for task in _take(tasks, 1))
+        yield from batches
+      return
+
+    parsed = queue.Queue()
+
+    def submit(task):
+      pool.apply_async(
+        _parse_shard,
+        (task,),
+        callback=lambda batches: parsed.put((batches, None)),
+        error_callback=lambda error: parsed.put((None, error))
+      )
+
+    in_flight = 0
+    for task in _take(tasks, window):
+      submit(task)
+      in_flight += 1
+
+    while (in_flight > 0):
+      batches, error = parsed.get()
+      in_flight -= 1
+      if (error is not None):
+        raise error
+
+      for task in _take(tasks, 1):
+        submit(task)
+        in_flight += 1
+      yield from batches
+
+
+def _take(iterator: Iterator, count: int) -> List:
+  return [task for _, task in zip(range(count), iterator)]
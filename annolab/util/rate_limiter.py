@@ -0,0 +1,202 @@
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterable, Iterator
+
+try:
+  import fcntl
+except ImportError:
+  fcntl = None
+
+
+class TokenBucket:
+  """
+    Thread-safe token bucket refilled at `rate` tokens per second, holding at most `burst` tokens.
+
+    Tokens are reserved up front and the caller sleeps off any debt outside the lock, so waiting callers
+    are served in order and requests larger than the bucket are slowed down rather than blocked forever.
+  """
+
+  def __init__(self, rate: float, burst: float = None):
+    self.rate = rate
+    self.burst = burst or rate
+    self.__tokens = self.burst
+    self.__updated = time.monotonic()
+    self.__lock = threading.Lock()
+
+
+  def acquire(self, amount: float = 1.0):
+    with self.__lock:
+      now = time.monotonic()
+      self.__tokens = min(self.burst, self.__tokens + (now - self.__updated) * self.rate)
+      self.__updated = now
+      self.__tokens -= amount
+      wait = max(0.0, -self.__tokens / self.rate)
+
+    if (wait > 0):
+      time.sleep(wait)
+
+
+class FileTokenBucket:
+  """
+    Token bucket whose state is kept in a local file and guarded by an exclusive file lock,
+    so it can be shared by every process on a machine. Requires fcntl (unix only).
+  """
+
+  def __init__(self, filepath: str, rate: float, burst: float = None):
+    if (fcntl is None):
+      raise Exception('Sharing a rate limit between processes requires fcntl, which is not available on this platform.')
+
+    self.filepath = filepath
+    self.rate = rate
+    self.burst = burst or rate
+    self.__lock = threading.Lock()
+
+
+  def acquire(self, amount: float = 1.0):
+    with self.__lock, open(self.filepath, 'a+') as f:
+      fcntl.flock(f, fcntl.LOCK_EX)
+      try:
+        f.seek(0)
+        contents = f.read()
+        state = json.loads(contents) if contents else { 'tokens': self.burst, 'updated': time.time() }
+
+        now = time.time()
+        tokens = min(self.burst, state['tokens'] + max(0.0, now - state['updated']) * self.rate)
+        tokens -= amount
+        wait = max(0.0, -tokens / self.rate)
+
+        f.seek(0)
+        f.truncate()
+        f.write(json.dumps({ 'tokens': tokens, 'updated': now }))
+        f.flush()
+      finally:
+        fcntl.flock(f, fcntl.LOCK_UN)
+
+    if (wait > 0):
+      time.sleep(wait)
+
+
+class RateLimiter:
+  """
+    Client-side request budget, applied by ApiHelper before every request.
+
+    Requests are grouped into endpoint classes (see endpoint_class). Each class gets its own
+    requests/s and bytes/s buckets, configured by the top-level arguments or overridden per class:
+
+      RateLimiter(
+        requests_per_second=20,
+        bytes_per_second=5_000_000,
+        limits={ 'annotation': { 'requests_per_second': 5, 'request_burst': 10 } }
+      )
+
+    Per class options are requests_per_second, bytes_per_second, request_burst and byte_burst.
+    Bursts default to one second's worth of the rate. Pre-signed file uploads are only limited if the
+    'upload' class is configured explicitly.
+
+    A limiter is shared by every thread using the same client. Passing state_dir keeps bucket state in
+    files under that directory instead, coordinating every process on the machine that uses it.
+  """
+
+  endpoint_prefixes = {
+    'v1/annotation': 'annotation',
+    'v1/relation': 'annotation',
+    'v1/source': 'source',
+    'v1/export': 'export',
+  }
+  # Checked before the prefixes, for endpoints nested under another resource.
+  endpoint_patterns = {
+    # v1/source/{owner}/{project}/{directory}/{source}/annotations
+    r'v1/source/[^/]+/[^/]+/[^/]+/[^/]+/annotations': 'annotation',
+  }
+
+  def __init__(
+    self,
+    requests_per_second: float = None,
+    bytes_per_second: float = None,
+    request_burst: float = None,
+    byte_burst: float = None,
+    limits: Dict[str, dict] = None,
+    state_dir: str = None
+  ):
+    self.defaults = {
+      'requests_per_second': requests_per_second,
+      'bytes_per_second': bytes_per_second,
+      'request_burst': request_burst,
+      'byte_burst': byte_burst,
+    }
+    self.limits = limits or {}
+    self.state_dir = state_dir
+    self.__buckets = {}
+    self.__lock = threading.Lock()
+
+    if (state_dir is not None):
+      os.makedirs(state_dir, exist_ok=True)
+
+
+  @classmethod
+  def endpoint_class(cls, path: str):
+    path = path.lstrip('/').split('?')[0].rstrip('/')
+    for pattern, endpoint_class in cls.endpoint_patterns.items():
+      if (re.fullmatch(pattern, path) is not None):
+        return endpoint_class
+
+    for prefix, endpoint_class in cls.endpoint_prefixes.items():
+      if (path.startswith(prefix)):
+        return endpoint_class
+
+    return 'default'
+
+
+  def acquire(self, endpoint_class: str, nbytes: int = 0):
+    """
+      Blocks until the endpoint class has budget for one request of nbytes.
+    """
+    request_bucket, byte_bucket = self.__buckets_for(endpoint_class)
+
+    if (request_bucket is not None):
+      request_bucket.acquire(1)
+    if (byte_bucket is not None and nbytes > 0):
+      byte_bucket.acquire(nbytes)
+
+
+  def limit_chunks(self, endpoint_class: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+      Applies the byte budget of an endpoint class to a streamed body as each chunk is sent.
+    """
+    _, byte_bucket = self.__buckets_for(endpoint_class)
+
+    for chunk in chunks:
+      if (byte_bucket is not None):
+        byte_bucket.acquire(len(chunk))
+      yield chunk
+
+
+  def __buckets_for(self, endpoint_class: str):
+    with self.__lock:
+      if (endpoint_class not in self.__buckets):
+        if (endpoint_class in self.limits):
+          options = { **self.defaults, **self.limits[endpoint_class] }
+        elif (endpoint_class == 'upload'):
+          options = {}
+        else:
+          options = self.defaults
+
+        self.__buckets[endpoint_class] = (
+          self.__create_bucket(endpoint_class, 'requests', options.get('requests_per_second'), options.get('request_burst')),
+          self.__create_bucket(endpoint_class, 'bytes', options.get('bytes_per_second'), options.get('byte_burst')),
+        )
+
+      return self.__buckets[endpoint_class]
+
+
+  def __create_bucket(self, endpoint_class: str, kind: str, rate: float, burst: float):
+    if (rate is None):
+      return None
+
+    if (self.state_dir is not None):
+      return FileTokenBucket(os.path.join(self.state_dir, f'{endpoint_class}-{kind}.json'), rate, burst)
+
+    return TokenBucket(rate, burst)
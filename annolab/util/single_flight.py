@@ -0,0 +1,62 @@
+import asyncio
+from concurrent.futures import Future
+import threading
+from typing import Any, Callable, Hashable
+
+
+class SingleFlight:
+  """
+    Coalesces concurrent calls made with the same key: while a call is in flight, other callers with
+    that key wait for it and share its result (or exception) instead of making their own.
+    Nothing is cached once the call completes.
+
+    Threads use do(), coroutines use do_async(). Both share the same in-flight calls.
+  """
+
+  def __init__(self):
+    self.__lock = threading.Lock()
+    self.__calls = {}
+
+
+  def do(self, key: Hashable, fn: Callable[[], Any]):
+    future, leader = self.__join(key)
+    if (leader):
+      self.__run(key, future, fn)
+
+    return future.result()
+
+
+  async def do_async(self, key: Hashable, fn: Callable[[], Any]):
+    """Runs a blocking fn in the event loop's default executor, unless a call with key is already in flight."""
+    future, leader = self.__join(key)
+    if (leader):
+      asyncio.get_running_loop().run_in_executor(None, self.__run, key, future, fn)
+
+    return await asyncio.wrap_future(future)
+
+
+  def __join(self, key: Hashable):
+    with self.__lock:
+      future = self.__calls.get(key)
+      if (future is not None):
+        return future, False
+
+      future = Future()
+      self.__calls[key] = future
+      return future, True
+
+
+  def __run(self, key: Hashable, future: Future, fn: Callable[[], Any]):
+    try:
+      result, error = fn(), None
+    except BaseException as e:
+      result, error = None, e
+
+    # The call is removed before it completes, so callers arriving afterwards start a new call.
+    with self.__lock:
+      del self.__calls[key]
+
+    if (error is not None):
+      future.set_exception(error)
+    else:
+      future.set_result(result)
@@ -16,6 +16,13 @@ setup(
     'polling2>=0.5.0',
     'jsonlines>=2.0.0'
   ],
+  extras_require={
+    'http2': ['httpx[http2]>=0.20.0'],
+    'geometry': ['numpy>=1.17'],
+  },
+  entry_points={
+    'console_scripts': ['annolab=annolab.cli:main'],
+  },
   long_description=open('README.rst').read(),
   classifiers=[
     'Development Status :: 3 - Alpha',